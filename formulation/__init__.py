@@ -0,0 +1,25 @@
+import sys
+
+default_app_config = 'formulation.apps.FormulationConfig'
+
+
+# These import their modules when called, so importing formulation doesn't
+# need settings to be configured.
+
+def render_iter(template, form, context=None, **kwargs):
+    '''See formulation.render.render_iter'''
+    from .render import render_iter
+    return render_iter(template, form, context, **kwargs)
+
+
+def render_field(template, form, name, context=None, **kwargs):
+    '''See formulation.render.render_field'''
+    from .render import render_field
+    return render_field(template, form, name, context, **kwargs)
+
+
+if sys.version_info >= (3, 6):
+    def arender(template, form, context=None, **kwargs):
+        '''See formulation.aio.arender'''
+        from .aio import arender
+        return arender(template, form, context, **kwargs)
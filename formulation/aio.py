@@ -0,0 +1,128 @@
+'''
+Rendering for asyncio code, such as ASGI views.  Needs Python 3.6 or later.
+
+A formset's forms are built, bound forms cleaned, and the choices of
+ModelChoiceFields fetched concurrently, in other threads before rendering
+starts, so no queries are made on the event loop.  Those queries are made
+outside any transaction of the caller's thread.
+'''
+import asyncio
+from copy import copy
+
+from django import forms
+from django.db import connections
+from django.forms.models import ModelChoiceIterator
+from django.template import Context
+from django.utils.safestring import mark_safe
+
+from .blocks import get_block_index
+from .fields import choice_source, normalize_choices
+from .render import form_list, form_plan, iter_forms
+from .templatetags.formulation import form_scope
+
+try:
+    from asgiref.sync import sync_to_async
+except ImportError:  # Django < 3.0
+    sync_to_async = None
+
+
+def queryset_fields(plans):
+    '''Yield (choice source, field) for each distinct queryset the blocks of
+    fields need choices from.'''
+    seen = set()
+    for form, plan in plans:
+        for name, block_name, info in plan or ():
+            field = form.fields[name]
+            if not isinstance(field, forms.ModelChoiceField) or \
+                    hasattr(field, '_choices'):
+                continue
+            if info is not None and \
+                    not info.reads('choices', 'selected', 'display'):
+                continue
+            key = choice_source(field)
+            if key is None or key in seen:
+                continue
+            seen.add(key)
+            yield key, field
+
+
+def in_worker(func, *args):
+    '''Call func, then close the database connections it opened in this
+    worker thread, which nothing else would.'''
+    try:
+        return func(*args)
+    finally:
+        for connection in connections.all():
+            connection.close()
+
+
+async def run_sync(func, *args):
+    '''Call a function which may query the database, in another thread.'''
+    if sync_to_async is not None:
+        # Not thread sensitive, so querysets are fetched concurrently.
+        return await sync_to_async(in_worker, thread_sensitive=False)(
+            func, *args)
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, in_worker, func, *args)
+
+
+async def fetch(queryset):
+    '''Evaluate a queryset without blocking the event loop.'''
+    if hasattr(queryset, '__aiter__'):  # Django 4.1+
+        return [obj async for obj in queryset]
+    return await run_sync(list, queryset)
+
+
+def prepare_forms(form):
+    '''form_list, with bound forms validated.
+
+    A model formset queries for its forms, and validating may query for
+    ModelChoiceField values.
+    '''
+    forms = form_list(form)
+    for form in forms:
+        if form.is_bound:
+            form.errors
+    return forms
+
+
+def model_choices(field, objects):
+    '''The choices of a ModelChoiceField, given its queryset's objects.'''
+    iterator = getattr(field, 'iterator', ModelChoiceIterator)(field)
+    choices = [] if field.empty_label is None else [('', field.empty_label)]
+    choices.extend(iterator.choice(obj) for obj in objects)
+    return choices
+
+
+async def prefetch_choices(plans, shared):
+    '''Fetch the choices fields need concurrently, into `shared`.'''
+    fields = list(queryset_fields(plans))
+    results = await asyncio.gather(*[
+        fetch(field.queryset.all()) for key, field in fields
+    ])
+    for (key, field), objects in zip(fields, results):
+        shared[key] = normalize_choices(model_choices(field, objects))
+
+
+async def arender(template, form, context=None, **kwargs):
+    '''Render the fields of a form, or a formset, as render_iter does.
+
+    A formset's forms are built and bound forms cleaned first, then the
+    queryset choices the blocks need are fetched, concurrently.
+    '''
+    if isinstance(context, Context):
+        # Others may use the context while we wait for the choices
+        context = copy(context)
+    else:
+        context = Context(context)
+
+    index = get_block_index(template, context)
+    # Blocks read the errors, which would clean the forms on the loop's thread
+    forms = await run_sync(prepare_forms, form)
+
+    choices = {}
+    with form_scope(context, index, forms[0], choices=choices) as safe_context:
+        plans = [(form, form_plan(safe_context, form)) for form in forms]
+        await prefetch_choices(plans, choices)
+        output = ''.join(iter_forms(safe_context, plans, kwargs))
+    return mark_safe(output)
@@ -0,0 +1,307 @@
+'''
+Work out which context variables a block reads, without rendering it.
+
+This follows {% use %} and nested {% block %} tags, so the result for a block
+covers everything rendering it could touch.  If a block contains something we
+can't see into, such as a tag we don't know, or {% use %} with a variable
+block name, its analysis is marked incomplete.  Tags which keep state
+between renders, such as {% cycle %}, mark it as not cacheable.
+'''
+from django.template.base import TextNode, Variable, VariableNode
+from django.template.defaulttags import (
+    AutoEscapeControlNode, CommentNode, CsrfTokenNode, CycleNode, FilterNode,
+    FirstOfNode, ForNode, IfChangedNode, IfEqualNode, IfNode, LoadNode,
+    SpacelessNode, WithNode,
+)
+from django.template.loader_tags import BlockNode
+from django.utils import six
+
+from .fields import FieldData
+
+FIELD_KEYS = frozenset(FieldData.getters) | frozenset(FieldData.choice_keys)
+# How a reference to the forloop of an enclosing {% for %} is named
+PARENTLOOP = 'forloop.parentloop'
+
+# Functions to scan Node classes from other tag libraries, keyed by class
+node_analysers = {}
+
+
+def analyser(node_class):
+    '''Register a function to scan nodes of node_class.
+
+    It will be called as func(node, scan)
+    '''
+    def register(func):
+        node_analysers[node_class] = func
+        return func
+    return register
+
+
+class BlockInfo(object):
+    '''What rendering a block reads from the context.'''
+    def __init__(self, name, references, uses, complete, cacheable=True):
+        self.name = name
+        self.references = frozenset(references)
+        self.uses = frozenset(uses)
+        self.complete = complete
+        # Its output is decided by the values it reads, and not by earlier
+        # renders of it
+        self.cacheable = cacheable
+        # Reads no field data which changes with the form's data, nor the
+        # forloop of a loop around it, so its output is decided by the values
+        # it reads
+        self.static = complete and cacheable and \
+            'forloop' not in self.references and \
+            self.references & FIELD_KEYS <= FieldData.static_keys
+
+    def __repr__(self):
+        return '<BlockInfo %s: %s%s>' % (
+            self.name,
+            ', '.join(sorted(self.references)),
+            '' if self.complete else ' (incomplete)',
+        )
+
+    @property
+    def field_data(self):
+        '''The exploded field values this block reads.'''
+        return self.references & FIELD_KEYS
+
+    def reads(self, *names):
+        '''Might rendering this block read any of these names?'''
+        if not self.complete:
+            return True
+        return not self.references.isdisjoint(names)
+
+
+def variable_name(var):
+    '''The context name a Variable looks up, or None for a literal.
+
+    forloop.parentloop (and its parentloop...) is named as such.
+    '''
+    if isinstance(var, Variable) and var.lookups:
+        name = var.lookups[0]
+        if name == 'forloop':
+            for lookup in var.lookups[1:]:
+                if lookup != 'parentloop':
+                    break
+                name += '.parentloop'
+            return name
+        if name not in ('None', 'True', 'False'):
+            return name
+    return None
+
+
+def expression_names(expr):
+    '''The context names a FilterExpression, and its filter arguments, use.'''
+    names = set()
+    name = variable_name(expr.var)
+    if name:
+        names.add(name)
+    for func, args in expr.filters:
+        for lookup, arg in args:
+            name = lookup and variable_name(arg)
+            if name:
+                names.add(name)
+    return names
+
+
+def condition_names(condition):
+    '''The context names an {% if %} condition uses.'''
+    names = set()
+    if condition is None:
+        return names
+    value = getattr(condition, 'value', None)
+    if value is not None:
+        names.update(expression_names(value))
+    for term in (getattr(condition, 'first', None),
+                 getattr(condition, 'second', None)):
+        names.update(condition_names(term))
+    return names
+
+
+class Scan(object):
+    '''Accumulates what a block's nodes read.'''
+    def __init__(self, analysis):
+        self.analysis = analysis
+        self.references = set()
+        self.uses = set()
+        self.complete = True
+        self.cacheable = True
+
+    def expressions(self, *exprs):
+        for expr in exprs:
+            self.references.update(expression_names(expr))
+
+    def nodelist(self, nodelist, bound=()):
+        '''Scan nodes, ignoring the names they bind for themselves.'''
+        inner = Scan(self.analysis)
+        for node in nodelist or ():
+            inner.node(node)
+        self.merge(inner, bound)
+
+    def loop(self, nodelist, loopvars):
+        '''Scan the body of a {% for %}, which sets loopvars and forloop.'''
+        inner = Scan(self.analysis)
+        for node in nodelist or ():
+            inner.node(node)
+        references = set()
+        for name in inner.references:
+            if name.startswith(PARENTLOOP):
+                # The parentloop in the body is the forloop outside it
+                references.add('forloop' + name[len(PARENTLOOP):])
+            elif name != 'forloop':
+                references.add(name)
+        inner.references = references
+        self.merge(inner, loopvars)
+
+    def merge(self, other, bound=()):
+        self.references.update(other.references.difference(bound))
+        self.uses.update(other.uses)
+        self.complete = self.complete and other.complete
+        self.cacheable = self.cacheable and other.cacheable
+
+    def block(self, name, bound=()):
+        '''Include what rendering another block reads.'''
+        info = self.analysis.get(name)
+        if info is None:
+            return
+        self.uses.add(name)
+        self.uses.update(info.uses)
+        self.references.update(info.references.difference(bound))
+        self.complete = self.complete and info.complete
+        self.cacheable = self.cacheable and info.cacheable
+
+    def node(self, node):
+        func = node_analysers.get(type(node)) or \
+            node_analysers.get(getattr(node, 'func', None))
+        if func is not None:
+            func(node, self)
+        elif isinstance(node, (TextNode, CommentNode, LoadNode)):
+            pass
+        elif isinstance(node, VariableNode):
+            self.expressions(node.filter_expression)
+        elif isinstance(node, IfNode):
+            for condition, nodelist in node.conditions_nodelists:
+                self.references.update(condition_names(condition))
+                self.nodelist(nodelist)
+        elif isinstance(node, ForNode):
+            self.expressions(node.sequence)
+            self.loop(node.nodelist_loop, node.loopvars)
+            self.nodelist(node.nodelist_empty)
+        elif isinstance(node, WithNode):
+            self.expressions(*node.extra_context.values())
+            self.nodelist(node.nodelist, node.extra_context)
+        elif isinstance(node, IfEqualNode):
+            self.expressions(node.var1, node.var2)
+            self.nodelist(node.nodelist_true)
+            self.nodelist(node.nodelist_false)
+        elif isinstance(node, FirstOfNode):
+            self.expressions(*node.vars)
+        elif isinstance(node, CycleNode):
+            # Its position is kept in the render_context
+            self.cacheable = False
+            self.expressions(*node.cyclevars)
+        elif isinstance(node, IfChangedNode):
+            # Compares with what it rendered last time
+            self.cacheable = False
+            self.expressions(*node._varlist)
+            self.nodelist(node.nodelist_true)
+            self.nodelist(node.nodelist_false)
+        elif isinstance(node, FilterNode):
+            self.expressions(node.filter_expr)
+            self.nodelist(node.nodelist, ('var',))
+        elif isinstance(node, (AutoEscapeControlNode, SpacelessNode)):
+            self.nodelist(node.nodelist)
+        elif isinstance(node, CsrfTokenNode):
+            self.references.add('csrf_token')
+        elif isinstance(node, BlockNode):
+            # Renders whichever version of the block is current
+            self.block(node.name)
+        else:
+            self.complete = False
+            for attr in getattr(node, 'child_nodelists', ()):
+                self.nodelist(getattr(node, attr, None))
+
+
+class Analysis(object):
+    '''The analysis of the blocks of a BlockIndex, by name.'''
+    def __init__(self, chains):
+        self.chains = chains
+        self.results = {}
+        self.pending = set()
+
+    def get(self, name):
+        try:
+            return self.results[name]
+        except KeyError:
+            pass
+        chain = self.chains.get(name)
+        if not chain:
+            return None
+        if name in self.pending:
+            # Blocks which use each other; don't trust the partial result.
+            return BlockInfo(name, (), (), False)
+
+        self.pending.add(name)
+        try:
+            scan = Scan(self)
+            scan.nodelist(chain[-1].nodelist, ('block',))
+            if 'block' in _references(chain[-1]):
+                # {{ block.super }} could reach any of its ancestors
+                for block in chain[:-1]:
+                    scan.nodelist(block.nodelist, ('block',))
+        finally:
+            self.pending.discard(name)
+
+        if any(ref.startswith(PARENTLOOP) for ref in scan.references):
+            # Depends on a loop around the block, which the key can't see
+            scan.cacheable = False
+        info = self.results[name] = BlockInfo(
+            name, scan.references, scan.uses, scan.complete, scan.cacheable,
+        )
+        return info
+
+    def all(self):
+        '''Analyse every block, returning a dict of name: BlockInfo.'''
+        return dict((name, self.get(name)) for name in self.chains)
+
+
+def _references(block):
+    '''Names a block's own nodes read, not following other blocks.'''
+    names = set()
+    for node in block.nodelist.get_nodes_by_type(VariableNode):
+        names.update(expression_names(node.filter_expression))
+    return names
+
+
+def literal_name(expr):
+    '''The value of a FilterExpression which is a plain string literal.'''
+    if expr.filters or not isinstance(expr.var, six.string_types):
+        return None
+    return expr.var
+
+
+def constant(expr, otherwise=None):
+    '''The value of a FilterExpression which is a literal with no filters.
+
+    Returns `otherwise` if its value depends on the context.
+    '''
+    if expr.filters:
+        return otherwise
+    var = expr.var
+    if not isinstance(var, Variable):
+        return var
+    if var.lookups is None and not var.translate:
+        return var.literal
+    return otherwise
+
+
+def profile(template, context=None):
+    '''Return {block name: BlockInfo} for every block in a widget template.'''
+    from django.template import Context
+    from .blocks import get_block_index
+
+    index = get_block_index(template, context or Context())
+    if index.analysis is None:
+        return Analysis(index.chains).all()
+    return index.analysis.all()
@@ -0,0 +1,17 @@
+import logging
+
+from django.apps import AppConfig
+from django.conf import settings
+
+logger = logging.getLogger('formulation')
+
+
+class FormulationConfig(AppConfig):
+    name = 'formulation'
+
+    def ready(self):
+        if getattr(settings, 'FORMULATION_WARM_UP', False):
+            from .warmup import warm_up
+
+            for problem in warm_up():
+                logger.warning('%s', problem)
@@ -0,0 +1,218 @@
+import os
+from itertools import count
+
+from django.conf import settings
+from django.template import TemplateDoesNotExist
+from django.template.base import Variable
+from django.template.loader import get_template
+from django.template.loader_tags import (
+    BlockNode, ExtendsNode, BlockContext, BLOCK_CONTEXT_KEY,
+)
+from django.utils import six
+
+from .analysis import Analysis
+from .caching import fingerprint
+from .utils import LRUCache
+
+# Maps a template (name or instance) to its BlockIndex
+_block_index = LRUCache(maxsize=256)
+_versions = count(1)
+
+
+def template_chain(template, context):
+    '''Yield (template, blocks, static) for a template and its parents.
+
+    `static` is False once a parent is chosen by something other than a
+    literal template name.
+    '''
+    static = True
+    bound = False
+    # Django 1.9+ remembers the templates {% extends %} found in the
+    # render_context, and skips them after; keep that to this chain.
+    context.render_context.push()
+    try:
+        while template is not None:
+            # If it's just the name, resolve into template
+            if isinstance(template, six.string_types):
+                template = get_template(template)
+            # Django 1.8+ loaders return the template wrapped for its backend
+            template = getattr(template, 'template', template)
+            # Django 1.8+ needs a template in the context to find parents
+            if getattr(context, 'template', False) is None:
+                context.template = template
+                bound = True
+
+            blocks = dict(
+                (block.name, block)
+                for block in template.nodelist.get_nodes_by_type(BlockNode)
+            )
+            yield template, blocks, static
+
+            # Do we extend a parent template?
+            extends = template.nodelist.get_nodes_by_type(ExtendsNode)
+            if not extends:
+                break
+            # Can only have one extends in a template
+            parent_name = extends[0].parent_name
+            if parent_name.filters or isinstance(parent_name.var, Variable):
+                static = False
+            template = extends[0].get_parent(context)
+    finally:
+        context.render_context.pop()
+        if bound:
+            context.template = None
+
+
+def resolve_blocks(template, context):
+    '''Get all the blocks from this template, accounting for 'extends' tags'''
+    try:
+        blocks = context.render_context[BLOCK_CONTEXT_KEY]
+    except KeyError:
+        blocks = context.render_context[BLOCK_CONTEXT_KEY] = BlockContext()
+
+    for tmpl, local_blocks, static in template_chain(template, context):
+        blocks.add_blocks(local_blocks)
+
+    return blocks
+
+
+def _source_mtime(template):
+    '''Return (path, mtime) for a template loaded from a file, or None.'''
+    origin = getattr(template, 'origin', None)
+    try:
+        path = origin.name
+        return path, os.path.getmtime(path)
+    except (AttributeError, TypeError, OSError):
+        return None
+
+
+def template_source(template):
+    '''The source of a template, or None if it can't be found.
+
+    Django 1.9+ keeps it on the template; before that, it's loaded again by
+    the template's name.
+    '''
+    source = getattr(template, 'source', None)
+    if isinstance(source, six.string_types):
+        return source
+    name = getattr(template, 'name', None)
+    if not isinstance(name, six.string_types):
+        return None
+    engine = getattr(template, 'engine', None)
+    if engine is not None:
+        loaders = engine.template_loaders
+    else:  # Django < 1.8
+        from django.template import loader
+        loaders = loader.template_source_loaders or ()
+    for source_loader in loaders:
+        # The cached loader wraps others
+        for inner in getattr(source_loader, 'loaders', [source_loader]):
+            # Or it may be a function, like the test loader of Django < 1.8
+            load = getattr(inner, 'load_template_source', inner)
+            try:
+                return load(name)[0]
+            except (TemplateDoesNotExist, NotImplementedError):
+                pass
+    return None
+
+
+class _IndexedBlocks(dict):
+    '''Per-render block stacks, copied from the index on first use.'''
+    def __init__(self, chains):
+        super(_IndexedBlocks, self).__init__()
+        self.chains = chains
+
+    def __missing__(self, name):
+        value = self[name] = list(self.chains.get(name, ()))
+        return value
+
+
+class BlockIndex(object):
+    '''The flattened block chain of a widget template and its parents.'''
+    def __init__(self, template, context):
+        self.chains = {}
+        self.sources = []
+        self.templates = []
+        self.static = True
+        self.template = None
+        # Maps a block to its compiled function, see compiler.compile_block
+        self.compiled = {}
+        for tmpl, blocks, static in template_chain(template, context):
+            if self.template is None:
+                self.template = tmpl
+            self.templates.append(tmpl)
+            for name, block in six.iteritems(blocks):
+                self.chains.setdefault(name, []).insert(0, block)
+            source = _source_mtime(tmpl)
+            if source is not None:
+                self.sources.append(source)
+            self.static = static
+        # Only indexes we keep get a version to key other caches on, or are
+        # worth analysing.
+        if self.static:
+            self.version = next(_versions)
+            self.analysis = Analysis(self.chains)
+            self.analysis.all()
+        else:
+            self.version = self.analysis = None
+
+    def fingerprint(self):
+        '''A digest of the source of the templates, the same in every
+        process, or None if any of it can't be found.'''
+        try:
+            return self._fingerprint
+        except AttributeError:
+            pass
+        sources = [template_source(tmpl) for tmpl in self.templates]
+        if None in sources:
+            self._fingerprint = None
+        else:
+            self._fingerprint = fingerprint(*sources)
+        return self._fingerprint
+
+    def is_stale(self):
+        '''Has any template in the chain changed on disk?'''
+        for path, mtime in self.sources:
+            try:
+                if os.path.getmtime(path) != mtime:
+                    return True
+            except OSError:
+                return True
+        return False
+
+    def block_context(self):
+        '''A fresh BlockContext, so {{ block.super }} can push and pop.'''
+        blocks = BlockContext()
+        blocks.blocks = _IndexedBlocks(self.chains)
+        # Saves {% use %} looking further up the context for the index
+        blocks.index = self
+        return blocks
+
+
+def _debug():
+    if settings.DEBUG or getattr(settings, 'TEMPLATE_DEBUG', False):
+        return True
+    try:
+        from django.template import engines
+    except ImportError:  # Django < 1.8
+        return False
+    # Django 1.8+ sets debug per engine, in the TEMPLATES setting
+    return any(
+        getattr(getattr(engine, 'engine', None), 'debug', False)
+        for engine in engines.all()
+    )
+
+
+def get_block_index(template, context):
+    '''Return the BlockIndex for a template, building it if needed.
+
+    In debug mode, indexes are rebuilt when a source template changes.
+    '''
+    index = _block_index.get(template)
+    if index is not None and not (_debug() and index.is_stale()):
+        return index
+
+    index = BlockIndex(template, context)
+    if index.static:
+        _block_index.set(template, index)
+    return index
@@ -0,0 +1,151 @@
+'''
+Caching of rendered {% form %} output, in a django.core.cache backend.
+
+Values which vary per request, like the CSRF token, are rendered as "holes":
+unique markers which are replaced with the real values after the fragment is
+taken from, or put in, the cache.
+'''
+import hashlib
+
+from django.conf import settings
+from django.utils import translation
+from django.utils.encoding import force_bytes, force_text
+from django.utils.functional import Promise
+from django.utils.html import conditional_escape
+from django.utils.safestring import mark_safe
+
+from .fields import choice_source, normalize_value
+from .utils import frozen
+
+try:
+    from django.core.cache import caches
+except ImportError:  # Django < 1.7
+    from django.core.cache import get_cache
+else:
+    def get_cache(alias):
+        return caches[alias]
+
+
+def fragment_cache():
+    '''The cache backend named by settings.FORMULATION_CACHE'''
+    return get_cache(getattr(settings, 'FORMULATION_CACHE', 'default'))
+
+
+def cache_holes():
+    '''Names of context values to leave out of cached fragments.'''
+    return getattr(settings, 'FORMULATION_CACHE_HOLES', ('csrf_token',))
+
+
+def hole_marker(name):
+    return 'formulation-hole-%s' % hashlib.md5(force_bytes(name)).hexdigest()
+
+
+def fingerprint(*sources):
+    '''A digest of pieces of template source, the same in every process.
+
+    Any change to the source changes it.
+    '''
+    digest = hashlib.md5()
+    for source in sources:
+        source = force_bytes(source)
+        # The length keeps the pieces apart
+        digest.update(force_bytes('%d:' % len(source)))
+        digest.update(source)
+    return digest.hexdigest()
+
+
+def token_source(tokens):
+    '''The parts of template tokens which come from the source.'''
+    return ['%s %s' % (token.token_type, token.contents) for token in tokens]
+
+
+def _text(value):
+    '''value, with lazy translations as text, so they repr by their value.'''
+    if isinstance(value, Promise):
+        return force_text(value)
+    if isinstance(value, tuple):
+        return tuple(_text(item) for item in value)
+    return value
+
+
+def field_state(field):
+    '''How a form field instance is set up, which forms often change in
+    __init__, or None if that can't be told.'''
+    source = choice_source(field)
+    if source is None and hasattr(field, 'choices'):
+        return None
+    state = _text((
+        source,
+        field.label,
+        field.help_text,
+        field.required,
+        frozen(field.widget.attrs),
+    ))
+    try:
+        hash(state)
+    except TypeError:
+        return None
+    return state
+
+
+def form_state(form):
+    '''Everything about a form which affects how it renders, or None if some
+    field's set up can't be told.'''
+    state = [
+        form.__class__.__module__,
+        form.__class__.__name__,
+        form.prefix,
+        form.auto_id,
+        form.is_bound,
+    ]
+    for bound_field in form:
+        setup = field_state(bound_field.field)
+        if setup is None:
+            return None
+        state.extend([
+            bound_field.html_name,
+            bound_field.field.__class__.__name__,
+            bound_field.field.widget.__class__.__name__,
+            setup,
+            normalize_value(bound_field.value()),
+        ])
+    if form.is_bound:
+        state.append(sorted(
+            (name, [force_text(error) for error in errors])
+            for name, errors in form.errors.items()
+        ))
+    return state
+
+
+def fragment_key(node, index, form, vary, holes):
+    '''The cache key for rendering a FormNode, or None if the source of the
+    widget template can't be found, or the form's state can't be told.'''
+    index_fingerprint = index.fingerprint()
+    if index_fingerprint is None:
+        return None
+    state = None
+    if form is not None:
+        state = form_state(form)
+        if state is None:
+            return None
+    digest = hashlib.md5()
+    for part in (
+        node.fingerprint(),
+        index_fingerprint,
+        translation.get_language(),
+        sorted(holes),
+        state,
+        vary,
+    ):
+        digest.update(force_bytes(repr(part)))
+        digest.update(b'\0')
+    return 'formulation:%s' % digest.hexdigest()
+
+
+def fill_holes(content, holes):
+    '''Replace hole markers with the (escaped) values they stand for.'''
+    for name, value in holes.items():
+        content = content.replace(
+            hole_marker(name), conditional_escape(force_text(value)),
+        )
+    return mark_safe(content)
@@ -0,0 +1,324 @@
+'''
+Compile the nodes of a widget block into a Python function.
+
+Text, variables and their filters, {% if %} and {% with %}, and tags which
+register a compiler (such as {% use %}), are turned into generated Python
+source, which renders them without walking the node tree.  Any other node is
+rendered as usual, from within the generated function.
+
+Nothing is compiled unless settings.FORMULATION_COMPILE is set.
+'''
+from django.conf import settings
+from django.template.base import (
+    TextNode, Variable, VariableDoesNotExist, VariableNode,
+    render_value_in_context,
+)
+from django.template.defaultfilters import default, escape
+from django.template.defaulttags import IfNode, TemplateLiteral, WithNode
+from django.utils import six
+from django.utils.encoding import force_text
+from django.utils.html import escape as escape_html
+from django.utils.safestring import SafeData, mark_safe
+from django.utils.timezone import template_localtime
+
+try:
+    from django.utils.safestring import EscapeData
+except ImportError:  # Django 2.0+
+    EscapeData = ()
+
+from .analysis import condition_names, expression_names
+from .utils import setting_changed
+
+# Functions to compile nodes of classes from other tag libraries, keyed by
+# class (or simple tag function, see analysis.analyser)
+node_compilers = {}
+
+# Checked before looking for a compiled block, so it costs nothing when off
+enabled = False
+
+
+def compiler(node_class):
+    '''Register a function to compile nodes of node_class.
+
+    It will be called as func(node, block_compiler), and may raise
+    Unsupported to have the node rendered as usual.
+    '''
+    def register(func):
+        node_compilers[node_class] = func
+        return func
+    return register
+
+
+def _update():
+    global enabled
+    enabled = bool(getattr(settings, 'FORMULATION_COMPILE', False))
+
+
+def _setting_changed(sender, setting, **kwargs):
+    if setting == 'FORMULATION_COMPILE':
+        _update()
+
+
+setting_changed.connect(_setting_changed)
+
+if settings.configured:
+    _update()
+
+
+class Unsupported(Exception):
+    '''Raised for a node, or part of one, which can't be compiled.'''
+
+
+def resolve(var, context, missing):
+    '''Variable.resolve, with `missing` for variables which don't exist.'''
+    try:
+        return var.resolve(context)
+    except VariableDoesNotExist:
+        return missing
+
+
+def resolve_name(name, var, context, missing):
+    '''resolve() for a Variable of a single name, which looks in the context
+    first, leaving anything else it might do to Variable.resolve.'''
+    for values in reversed(context.dicts):
+        if name in values:
+            value = values[name]
+            break
+    else:
+        return resolve(var, context, missing)
+    if callable(value):
+        return resolve(var, context, missing)
+    return value
+
+
+def render_value(value, context):
+    '''render_value_in_context, skipping straight to escaping for text.'''
+    if not isinstance(value, six.text_type) or isinstance(value, EscapeData):
+        return render_value_in_context(value, context)
+    if context.autoescape and not isinstance(value, SafeData):
+        return escape_html(value)
+    return value
+
+
+def condition(cond, context):
+    '''Evaluate an {% if %} condition, as IfNode does.'''
+    try:
+        return cond.eval(context)
+    except VariableDoesNotExist:
+        return None
+
+
+def safe_filter(func, value, *args, **kwargs):
+    '''Apply an is_safe filter, keeping the value safe if it was.'''
+    result = func(value, *args, **kwargs)
+    if isinstance(value, SafeData):
+        return mark_safe(result)
+    return result
+
+
+class BlockCompiler(object):
+    '''Generates the source of a function rendering a nodelist.'''
+    def __init__(self):
+        self.lines = []
+        self.depth = 1
+        self.namespace = {
+            'resolve': resolve,
+            'resolve_name': resolve_name,
+            'condition': condition,
+            'safe_filter': safe_filter,
+            'render_value': render_value,
+            'localtime': template_localtime,
+            'force_text': force_text,
+            'mark_safe': mark_safe,
+        }
+        self.constants = 0
+        self.compiled = 0
+        self.fallbacks = 0
+
+    def const(self, value):
+        '''The name of a constant holding value.'''
+        name = '_%d' % self.constants
+        self.constants += 1
+        self.namespace[name] = value
+        return name
+
+    def line(self, code):
+        self.lines.append('    ' * self.depth + code)
+
+    def output(self, code):
+        self.line('append(%s)' % code)
+
+    def indented(self, nodelist):
+        self.depth += 1
+        self.line('pass')
+        self.nodelist(nodelist)
+        self.depth -= 1
+
+    def nodelist(self, nodelist):
+        for node in nodelist:
+            self.node(node)
+
+    def node(self, node):
+        '''Compile a node, or else render it as usual.'''
+        mark = len(self.lines)
+        depth = self.depth
+        try:
+            self.compile_node(node)
+        except Unsupported:
+            del self.lines[mark:]
+            self.depth = depth
+            self.fallbacks += 1
+            render = getattr(node, 'render_annotated', node.render)
+            self.output('force_text(%s(context))' % self.const(render))
+        else:
+            self.compiled += 1
+
+    def compile_node(self, node):
+        func = node_compilers.get(type(node)) or \
+            node_compilers.get(getattr(node, 'func', None))
+        if func is not None:
+            func(node, self)
+        elif isinstance(node, TextNode):
+            if node.s:
+                self.output(self.const(node.s))
+        elif isinstance(node, VariableNode):
+            self.output('render_value(%s, context)' % self.expression(
+                node.filter_expression,
+            ))
+        elif isinstance(node, IfNode):
+            keyword = 'if'
+            for cond, nodelist in node.conditions_nodelists:
+                if cond is None:
+                    self.line('else:')
+                else:
+                    self.line('%s %s:' % (keyword, self.condition(cond)))
+                    keyword = 'elif'
+                self.indented(nodelist)
+        elif isinstance(node, WithNode):
+            self.line('context.dicts.append({%s})' % ', '.join(
+                '%s: %s' % (self.const(key), self.expression(value))
+                for key, value in six.iteritems(node.extra_context)
+            ))
+            self.line('try:')
+            self.indented(node.nodelist)
+            self.line('finally:')
+            self.line('    context.dicts.pop()')
+        else:
+            raise Unsupported(node)
+
+    def condition(self, cond):
+        if isinstance(cond, TemplateLiteral) and not cond.value.filters:
+            # As TemplateLiteral.eval, which ignores failures
+            return self.expression(cond.value, 'None')
+        return 'condition(%s, context)' % self.const(cond)
+
+    def variable(self, var, missing):
+        if getattr(var, 'translate', False):
+            raise Unsupported(var)
+        if var.lookups is None:
+            return self.const(var.literal)
+        if len(var.lookups) == 1:
+            return 'resolve_name(%s, %s, context, %s)' % (
+                self.const(var.lookups[0]), self.const(var), missing,
+            )
+        return 'resolve(%s, context, %s)' % (self.const(var), missing)
+
+    def expression(self, expr, missing="u''"):
+        '''Source evaluating a FilterExpression, as expr.resolve() would.
+
+        Missing variables are `missing`, so string_if_invalid must be empty.
+        '''
+        if isinstance(expr.var, Variable):
+            code = self.variable(expr.var, missing)
+        else:
+            code = self.const(expr.var)
+        for func, args in expr.filters:
+            code = self.filter(func, args, code)
+        return code
+
+    def filter(self, func, args, code):
+        if func is escape:
+            # Marks its value for escaping, which changes later filters
+            raise Unsupported(func)
+        values = []
+        for lookup, arg in args:
+            if not lookup:
+                values.append(self.const(mark_safe(arg)))
+            elif arg.lookups is None and not getattr(arg, 'translate', False):
+                values.append(self.const(arg.literal))
+            else:
+                values.append('%s.resolve(context)' % self.const(arg))
+
+        if getattr(func, 'expects_localtime', False):
+            code = 'localtime(%s, context.use_tz)' % code
+        if func is default:
+            return '(%s or %s)' % (code, values[0])
+        if getattr(func, 'needs_autoescape', False):
+            values.append('autoescape=context.autoescape')
+        if getattr(func, 'is_safe', False):
+            return 'safe_filter(%s)' % ', '.join(
+                [self.const(func), code] + values
+            )
+        return '%s(%s)' % (self.const(func), ', '.join([code] + values))
+
+    def function(self):
+        '''Build the function from the compiled source.'''
+        lines = [
+            'def render(context):',
+            '    out = []',
+            '    append = out.append',
+        ]
+        if self.fallbacks:
+            # Nodes rendered as usual may set values, as in BlockNode.render
+            lines.append('    context.dicts.append({})')
+            lines.append('    try:')
+            lines.extend('    ' + line for line in self.lines)
+            lines.append('    finally:')
+            lines.append('        context.dicts.pop()')
+        else:
+            lines.extend(self.lines)
+        lines.append("    return mark_safe(u''.join(out))")
+        six.exec_('\n'.join(lines), self.namespace)
+        return self.namespace['render']
+
+
+def reads_block(block):
+    '''Does a block read `block`, such as for {{ block.super }}?'''
+    for node in block.nodelist.get_nodes_by_type(VariableNode):
+        if 'block' in expression_names(node.filter_expression):
+            return True
+    for node in block.nodelist.get_nodes_by_type(IfNode):
+        for cond, nodelist in node.conditions_nodelists:
+            if 'block' in condition_names(cond):
+                return True
+    return False
+
+
+def compile_block(block, invalid='', info=None):
+    '''Return a function rendering a block's nodes in a context, or None.
+
+    Blocks which read `block` are left to BlockNode.render, as are those
+    with nothing that can be compiled.  `invalid` is the string_if_invalid
+    of the template engine.
+
+    If the block's BlockInfo is given, blocks which may render a block of
+    their own name are also left to BlockNode.render, which takes a block
+    off the block stack while rendering it.
+    '''
+    if invalid or reads_block(block):
+        return None
+    if info is not None and (not info.complete or block.name in info.uses):
+        return None
+    block_compiler = BlockCompiler()
+    block_compiler.nodelist(block.nodelist)
+    if not block_compiler.compiled:
+        return None
+    return block_compiler.function()
+
+
+def string_if_invalid(template):
+    '''What the engine of a template renders missing variables as.'''
+    engine = getattr(template, 'engine', None)
+    if engine is not None:
+        return engine.string_if_invalid
+    return getattr(settings, 'TEMPLATE_STRING_IF_INVALID', '')
@@ -0,0 +1,193 @@
+from django.utils.encoding import force_text
+
+from .utils import frozen
+
+try:
+    from django.core.exceptions import EmptyResultSet
+except ImportError:  # Django < 1.11
+    from django.db.models.sql.datastructures import EmptyResultSet
+
+
+def normalize_choices(choices):
+    '''Consume choices once, returning (choices, labels).
+
+    Keys are converted to text, so they compare equal to the normalized value.
+    labels maps every key, including those in option groups, to its label.
+    '''
+    normalized = []
+    labels = {}
+    for key, label in choices:
+        key = force_text(key)
+        if isinstance(label, (list, tuple)):
+            label = tuple((force_text(k), v) for k, v in label)
+            labels.update(label)
+        else:
+            labels[key] = label
+        normalized.append((key, label))
+    return tuple(normalized), labels
+
+
+def choice_source(field):
+    '''A key for where a form field's choices come from, or None.
+
+    Fields with equal keys have the same choices, even in different forms.
+    '''
+    queryset = getattr(field, 'queryset', None)
+    if queryset is not None and not hasattr(field, '_choices'):
+        try:
+            sql = queryset.query.sql_with_params()
+        except EmptyResultSet:
+            sql = None
+        key = (
+            field.__class__,
+            queryset.model,
+            queryset.db,
+            sql,
+            field.empty_label,
+            field.to_field_name,
+            # Often replaced on the instance, to change labels
+            field.__dict__.get('label_from_instance'),
+        )
+    else:
+        choices = getattr(field, 'choices', None)
+        if not isinstance(choices, (list, tuple)):
+            return None
+        key = frozen(choices)
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+def shared_choices(field, shared):
+    '''normalize_choices for a form field, sharing the result through the
+    dict `shared` with other fields with the same choice source.
+    '''
+    key = choice_source(field) if shared is not None else None
+    if key is None:
+        return normalize_choices(field.choices)
+    try:
+        return shared[key]
+    except KeyError:
+        result = shared[key] = normalize_choices(field.choices)
+        return result
+
+
+def normalize_value(value):
+    '''Normalize a field value [django.forms.widgets.Select.render_options]'''
+    if value is None:  # don't force_text these
+        return value
+    if isinstance(value, (list, tuple)):
+        return [force_text(v) for v in value]
+    return force_text(value)
+
+
+class FieldData(dict):
+    '''The values of a BoundField exploded into the context.
+
+    Nothing is computed until a block looks it up, and then only once.
+    Values passed in take precedence over those of the field.
+
+    If the BlockInfo of the block being rendered is given, work it shows the
+    block can't need is skipped.  Normalized choices are shared with other
+    fields through the dict `choices`, if given.
+    '''
+    getters = {
+        'form_field': lambda field: field,
+        'id': lambda field: field.auto_id,
+        'widget_type': lambda field: field.field.widget.__class__.__name__,
+        'field_class': lambda field: field.field.__class__.__name__,
+        'widget': lambda field: getattr(field.field, 'widget', None),
+        'required': lambda field: getattr(field.field, 'required', None),
+        # Whether a CheckboxInput is ticked
+        'checked': lambda field: getattr(
+            field.field.widget, 'check_test', bool)(field.value()),
+    }
+    for attr in ('css_classes', 'errors', 'field', 'form', 'help_text',
+                 'html_name', 'id_for_label', 'label', 'name'):
+        getters[attr] = lambda field, attr=attr: getattr(field, attr)
+    del attr
+
+    choice_keys = ('choices', 'value', 'selected', 'display')
+    # Values which only depend on the form's class, prefix and auto_id, and
+    # not on its data or errors
+    static_keys = frozenset([
+        'id', 'id_for_label', 'html_name', 'name', 'label', 'help_text',
+        'required', 'widget_type', 'field_class',
+    ])
+
+    def __init__(self, field, values=(), info=None, choices=None):
+        super(FieldData, self).__init__(values)
+        self.form_field = field
+        self.info = info
+        self.shared = choices
+
+    def __missing__(self, key):
+        if key == 'value' and self.info is not None and \
+                not self.info.reads('choices', 'selected', 'display'):
+            # Don't evaluate choices just to decide how to treat the value.
+            field = self.form_field
+            if hasattr(field.field, 'choices'):
+                value = self[key] = normalize_value(field.value())
+            else:
+                value = self[key] = field.value
+            return value
+        if key in self.choice_keys:
+            self.explode_choices()
+            return dict.__getitem__(self, key)
+        try:
+            getter = self.getters[key]
+        except KeyError:
+            raise KeyError(key)
+        value = self[key] = getter(self.form_field)
+        return value
+
+    def __contains__(self, key):
+        return (
+            dict.__contains__(self, key) or
+            key in self.getters or
+            key in self.choice_keys
+        )
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self):
+        keys = set(self.getters)
+        keys.update(self.choice_keys)
+        keys.update(dict.keys(self))
+        return list(keys)
+
+    def get(self, key, otherwise=None):
+        if key in self:
+            return self[key]
+        return otherwise
+
+    def explode_choices(self):
+        '''Work out choices, value, selected and display in one pass.'''
+        field = self.form_field
+        choices = getattr(field.field, 'choices', None)
+        if choices is not None:
+            choices, labels = shared_choices(field.field, self.shared)
+
+        if choices:
+            value = normalize_value(field.value())
+            if value is None:
+                selected = frozenset()
+                display = ''
+            elif isinstance(value, list):
+                selected = frozenset(value)
+                display = [labels[v] for v in value if v in labels]
+            else:
+                selected = frozenset([value])
+                display = labels.get(value, '')
+        else:
+            value = field.value
+            selected = frozenset()
+            display = ''
+
+        self.setdefault('choices', choices)
+        self.setdefault('value', value)
+        self.setdefault('selected', selected)
+        self.setdefault('display', display)
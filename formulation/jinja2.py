@@ -0,0 +1,289 @@
+'''
+A Jinja2 extension providing {% form %}, {% field %}, {% use %} and
+{% reuse %}, for templates rendered with Jinja2.
+
+    Environment(extensions=['formulation.jinja2.FormulationExtension'])
+
+Widget templates are Jinja2 templates too.  Jinja2 compiles each of their
+blocks to a Python function, which is called directly, like a macro, to
+render a field.
+'''
+from __future__ import absolute_import
+
+from django.utils import six
+from jinja2 import nodes
+from jinja2.exceptions import TemplateRuntimeError
+from jinja2.ext import Extension
+from jinja2.runtime import new_context
+from markupsafe import Markup
+
+from .blocks import _versions
+from .fields import FieldData
+from .templatetags.formulation import (
+    MISSING, _dispatch_cache, auto_widget, flat_attrs,
+)
+from .utils import LRUCache
+
+# Maps (environment, template) to its JinjaIndex
+_jinja_index = LRUCache(maxsize=256)
+
+
+def parent_name(environment, template):
+    '''The name of the template a Jinja2 template extends, or None.'''
+    if template.name is None or environment.loader is None:
+        return None
+    source = environment.loader.get_source(environment, template.name)[0]
+    ast = environment.parse(source, template.name, template.filename)
+    for node in ast.find_all(nodes.Extends):
+        if not isinstance(node.template, nodes.Const):
+            raise TemplateRuntimeError(
+                "%s: widget templates can only extend a template named by "
+                "a literal" % template.name
+            )
+        return node.template.value
+    return None
+
+
+class JinjaIndex(object):
+    '''The block chains of a Jinja2 widget template and its parents.
+
+    Each chain is a list of the compiled block functions, child first, as
+    Jinja2 keeps them in a context's `blocks` for super().
+    '''
+    def __init__(self, environment, template):
+        self.chains = {}
+        self.templates = []
+        while template is not None:
+            template = environment.get_template(template)
+            self.templates.append(template)
+            for name, func in six.iteritems(template.blocks):
+                self.chains.setdefault(name, []).append(func)
+            template = parent_name(environment, template)
+        self.name = self.templates[0].name
+        self.version = next(_versions)
+
+    def is_stale(self):
+        return not all(template.is_up_to_date for template in self.templates)
+
+
+def get_jinja_index(environment, template):
+    '''Return the JinjaIndex for a template, building it if needed.
+
+    If the environment auto-reloads, so are indexes whose templates changed.
+    '''
+    key = (environment, template)
+    index = _jinja_index.get(key)
+    if index is None or (environment.auto_reload and index.is_stale()):
+        index = JinjaIndex(environment, template)
+        _jinja_index.set(key, index)
+    return index
+
+
+def dispatch(index, field):
+    '''The name of the block auto_widget would pick for this field, or None.
+
+    Shares the cache of formulation.templatetags.formulation.dispatch_widget.
+    '''
+    key = (
+        index.version,
+        field.field.__class__,
+        field.field.widget.__class__,
+        field.name,
+    )
+    name = _dispatch_cache.get(key, MISSING)
+    if name is MISSING:
+        for name in auto_widget(field):
+            if name in index.chains:
+                break
+        else:
+            name = None
+        _dispatch_cache.set(key, name)
+    return name
+
+
+class JinjaFieldData(FieldData):
+    '''FieldData with the values Django templates would call, called.'''
+    called = ('value', 'css_classes')
+
+    def __missing__(self, key):
+        value = super(JinjaFieldData, self).__missing__(key)
+        if key in self.called and callable(value):
+            value = self[key] = value()
+        return value
+
+
+class Layer(object):
+    '''The values for a block, over the context it is rendered from.'''
+    __slots__ = ('values', 'context')
+
+    def __init__(self, values, context):
+        self.values = values
+        self.context = context
+
+    def __contains__(self, key):
+        return key in self.values or key in self.context
+
+    def __getitem__(self, key):
+        if key in self.values:
+            return self.values[key]
+        return self.context[key]
+
+    def keys(self):
+        keys = set(self.context.get_all())
+        keys.update(self.values.keys())
+        return list(keys)
+
+
+class FormScope(object):
+    '''What {% form %} gives the tags inside it, as `formulation`.'''
+    def __init__(self, environment, index, form):
+        self.environment = environment
+        self.index = index
+        self.form = form
+        # Normalized choices shared by fields, see fields.shared_choices
+        self.choices = {}
+
+    def render(self, name, values, context):
+        '''Render a block of the widget template with values added to
+        context.'''
+        values['formulation'] = self
+        block_context = new_context(
+            self.environment, self.index.name, {},
+            Layer(values, context), shared=True,
+        )
+        block_context.blocks = self.index.chains
+        block_context.eval_ctx = context.eval_ctx
+        output = u''.join(self.index.chains[name][0](block_context))
+        if context.eval_ctx.autoescape:
+            output = Markup(output)
+        return output
+
+
+class FormulationExtension(Extension):
+    '''
+    {% form "template.jinja" [form] %}
+        {% field form.somefield ["blockname"] [key=value...] %}
+        {% use "blockname" [key=value...] %}
+    {% endform %}
+
+    {% reuse "blockname" [key=value...] %}
+
+    Also adds the flat_attrs and auto_widget filters.
+    '''
+    tags = set(['form', 'field', 'use', 'reuse'])
+
+    def __init__(self, environment):
+        super(FormulationExtension, self).__init__(environment)
+        environment.filters.setdefault('flat_attrs', flat_attrs)
+        environment.filters.setdefault('auto_widget', auto_widget)
+
+    def parse(self, parser):
+        tag = next(parser.stream)
+        return getattr(self, 'parse_' + tag.value)(parser, tag.lineno)
+
+    def parse_kwargs(self, parser):
+        '''Parse key=value... up to the end of the tag, into a Dict node.'''
+        items = []
+        while parser.stream.current.type != 'block_end':
+            key = parser.stream.expect('name')
+            parser.stream.expect('assign')
+            value = parser.parse_expression()
+            items.append(nodes.Pair(
+                nodes.Const(key.value), value, lineno=key.lineno,
+            ))
+        return nodes.Dict(items)
+
+    def at_kwargs(self, parser):
+        stream = parser.stream
+        return stream.current.type == 'block_end' or (
+            stream.current.type == 'name' and stream.look().type == 'assign'
+        )
+
+    def parse_form(self, parser, lineno):
+        args = [parser.parse_expression()]
+        if parser.stream.current.type != 'block_end':
+            args.append(parser.parse_expression())
+        else:
+            args.append(nodes.Const(None))
+        body = parser.parse_statements(['name:endform'], drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method('_form', args),
+            [nodes.Name('formulation', 'param')], [], body,
+        ).set_lineno(lineno)
+
+    def parse_field(self, parser, lineno):
+        field = parser.parse_expression()
+        widget = nodes.Const(None)
+        if not self.at_kwargs(parser):
+            widget = parser.parse_expression()
+        return self.output('_field', lineno, [
+            field, widget, self.parse_kwargs(parser),
+        ])
+
+    def parse_use(self, parser, lineno):
+        widget = parser.parse_expression()
+        return self.output('_use', lineno, [
+            widget, self.parse_kwargs(parser),
+        ])
+
+    def parse_reuse(self, parser, lineno):
+        names = parser.parse_expression()
+        return nodes.Output([self.call_method('_reuse', [
+            nodes.ContextReference(), names, self.parse_kwargs(parser),
+        ])]).set_lineno(lineno)
+
+    def output(self, method, lineno, args):
+        '''Output the result of method(formulation, context, *args).'''
+        args = [
+            nodes.Name('formulation', 'load'), nodes.ContextReference(),
+        ] + args
+        return nodes.Output([
+            self.call_method(method, args),
+        ]).set_lineno(lineno)
+
+    def get_scope(self, scope, tag_name):
+        if not isinstance(scope, FormScope):
+            raise TemplateRuntimeError(
+                '{%% %s %%} can only be used inside {%% form %%}' % tag_name
+            )
+        return scope
+
+    def _form(self, template, form, caller):
+        index = get_jinja_index(self.environment, template)
+        return caller(FormScope(self.environment, index, form))
+
+    def _field(self, scope, context, field, widget, values):
+        scope = self.get_scope(scope, 'field')
+        if isinstance(field, six.string_types):
+            field = scope.form[field]
+
+        name = dispatch(scope.index, field) if widget is None else widget
+        if name not in scope.index.chains:
+            raise TemplateRuntimeError(
+                "No widget for field: %s (%r) [Tried: %s]" % (
+                    field.name,
+                    field.field,
+                    [widget] if widget else auto_widget(field),
+                )
+            )
+        # Allow supplied values to override field data
+        values = JinjaFieldData(field, values, None, scope.choices)
+        return scope.render(name, values, context)
+
+    def _use(self, scope, context, widget, values):
+        scope = self.get_scope(scope, 'use')
+        return scope.render(widget, values, context)
+
+    def _reuse(self, context, names, values):
+        if not isinstance(names, list):
+            names = [names]
+        for name in names:
+            chain = context.blocks.get(name)
+            if chain:
+                break
+        else:
+            return u''
+        output = u''.join(chain[0](context.derived(values)))
+        if context.eval_ctx.autoescape:
+            output = Markup(output)
+        return output
@@ -0,0 +1,45 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...warmup import configured_forms, warm_up
+
+
+class Command(BaseCommand):
+    help = (
+        'Load and index widget templates (all .form templates by default), '
+        'and check forms have a block for every field.'
+    )
+    args = '[template ...]'
+    form_help = (
+        'Check the form class at this path against the template, as well as '
+        'those in FORMULATION_WARM_UP_FORMS.'
+    )
+    if hasattr(BaseCommand, 'option_list'):  # Django < 1.10
+        option_list = BaseCommand.option_list + (
+            make_option('--form', action='append', nargs=2, default=[],
+                        metavar='TEMPLATE FORM', help=form_help),
+        )
+
+    def add_arguments(self, parser):
+        parser.add_argument('templates', nargs='*')
+        parser.add_argument('--form', action='append', nargs=2, default=[],
+                            metavar=('TEMPLATE', 'FORM'), help=self.form_help)
+
+    def handle(self, *templates, **options):
+        templates = templates or options.get('templates')
+        forms = None
+        if options['form']:
+            forms = dict(
+                (template, list(paths))
+                for template, paths in configured_forms().items()
+            )
+            for template, form in options['form']:
+                forms.setdefault(template, []).append(form)
+
+        problems = warm_up(templates or None, forms)
+        for problem in problems:
+            self.stderr.write(str(problem))
+        if problems:
+            raise CommandError('%d problem(s) found' % len(problems))
+        self.stdout.write('No problems found')
@@ -0,0 +1,181 @@
+'''
+Optional timing of {% form %}, {% formset %}, field and {% use %} rendering.
+
+Nothing is timed unless settings.FORMULATION_PROFILE or
+FORMULATION_PROFILE_BUDGET is set, or a collect() block is active.
+'''
+import logging
+import threading
+from contextlib import contextmanager
+from timeit import default_timer as timer
+
+from django.conf import settings
+from django.dispatch import Signal
+
+from .utils import setting_changed
+
+logger = logging.getLogger('formulation.profiling')
+
+# Sent with `profile`, a FormProfile, after each {% form %} or {% formset %}
+form_rendered = Signal()
+
+# Checked before timing anything, so it costs nothing when off
+enabled = False
+
+_collecting = 0
+_lock = threading.Lock()
+_local = threading.local()
+
+
+class Record(object):
+    '''The rendering of a field, or a {% use %}d block.
+
+    kind: 'field' or 'block'
+    name: the html_name of the field, or the block name
+    block: the name of the block rendered
+    duration: in seconds, including any blocks it used
+    size: length of the output
+    candidates: how many auto-widget names are tried before finding block
+    choices: the number of choices, if the block used them
+    '''
+    __slots__ = (
+        'kind', 'name', 'block', 'duration', 'size', 'candidates', 'choices',
+    )
+
+    def __init__(self, kind, name, block, duration, size,
+                 candidates=None, choices=None):
+        self.kind = kind
+        self.name = name
+        self.block = block
+        self.duration = duration
+        self.size = size
+        self.candidates = candidates
+        self.choices = choices
+
+    def __repr__(self):
+        return '<Record %s %s (%s): %.2fms>' % (
+            self.kind, self.name, self.block, self.duration * 1000,
+        )
+
+
+def slowest(records, count=5):
+    records = sorted(records, key=lambda record: record.duration, reverse=True)
+    return records[:count]
+
+
+class FormProfile(object):
+    '''The records of everything rendered by a {% form %} or {% formset %}.'''
+    def __init__(self, template, form):
+        self.template = template
+        self.form = form
+        self.records = []
+        self.duration = None
+        self.size = None
+
+    def slowest(self, count=5):
+        return slowest(self.records, count)
+
+
+class Collector(object):
+    '''The records and forms rendered in a collect() block.'''
+    def __init__(self):
+        self.records = []
+        self.forms = []
+
+    def slowest(self, count=5):
+        return slowest(self.records, count)
+
+
+def _stack(name):
+    try:
+        return getattr(_local, name)
+    except AttributeError:
+        stack = []
+        setattr(_local, name, stack)
+        return stack
+
+
+def _update():
+    global enabled
+    enabled = bool(
+        _collecting or
+        getattr(settings, 'FORMULATION_PROFILE', False) or
+        getattr(settings, 'FORMULATION_PROFILE_BUDGET', None) is not None
+    )
+
+
+def _setting_changed(sender, setting, **kwargs):
+    if setting.startswith('FORMULATION_PROFILE'):
+        _update()
+
+
+setting_changed.connect(_setting_changed)
+
+if settings.configured:
+    _update()
+
+
+@contextmanager
+def collect():
+    '''Collect what is rendered in this thread, while in the block.
+
+        with profiling.collect() as collector:
+            response = view(request)
+        print(collector.slowest())
+    '''
+    global _collecting
+    collector = Collector()
+    _stack('collectors').append(collector)
+    with _lock:
+        _collecting += 1
+    _update()
+    try:
+        yield collector
+    finally:
+        _stack('collectors').remove(collector)
+        with _lock:
+            _collecting -= 1
+        _update()
+
+
+def add(record):
+    '''Add a record to every open FormProfile and collector.'''
+    for target in _stack('forms'):
+        target.records.append(record)
+    for target in _stack('collectors'):
+        target.records.append(record)
+
+
+@contextmanager
+def profile_form(template, form):
+    '''Time rendering a form.  The caller should set the profile's size.'''
+    profile = FormProfile(template, form)
+    forms = _stack('forms')
+    forms.append(profile)
+    start = timer()
+    try:
+        yield profile
+    finally:
+        profile.duration = timer() - start
+        forms.pop()
+    for collector in _stack('collectors'):
+        collector.forms.append(profile)
+    form_rendered.send(sender=FormProfile, profile=profile)
+    check_budget(profile)
+
+
+def check_budget(profile):
+    '''Log the slowest fields of a form which took too long to render.'''
+    budget = getattr(settings, 'FORMULATION_PROFILE_BUDGET', None)
+    if budget is None or profile.duration * 1000 <= budget:
+        return
+    logger.warning(
+        'Rendering with %s took %.1fms, over the budget of %sms. Slowest: %s',
+        profile.template, profile.duration * 1000, budget,
+        ', '.join(
+            '%s (%s) %.1fms' % (
+                record.name, record.block, record.duration * 1000,
+            )
+            for record in profile.slowest()
+        ),
+    )
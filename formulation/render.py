@@ -0,0 +1,81 @@
+from copy import copy
+
+from django.forms.formsets import ManagementForm
+from django.template import Context
+from django.utils.encoding import force_text
+
+from .blocks import get_block_index
+from .templatetags.formulation import (
+    extra_context, field, field_plan, form_scope, has_blocks, iter_fields,
+)
+
+
+def form_list(form):
+    '''A form as a list, or a formset as its management form and forms.'''
+    management_form = getattr(form, 'management_form', None)
+    if management_form is None:
+        return [form]
+    forms = [management_form]
+    forms.extend(form)
+    return forms
+
+
+def form_plan(context, form):
+    '''The field_plan of a form, or None for a management form the widget
+    template has no blocks for, as {% formset %} renders those itself.'''
+    if isinstance(form, ManagementForm) and not has_blocks(context, form):
+        return None
+    return field_plan(context, form)
+
+
+def iter_forms(context, plans, values):
+    '''Render [(form, plan), ...], yielding the output of each field, or of
+    a form without a plan as a whole.'''
+    row = {}
+    with extra_context(context, row):
+        for form, plan in plans:
+            if plan is None:
+                yield force_text(form)
+                continue
+            row['formulation-form'] = form
+            for chunk in iter_fields(context, form, plan, values):
+                yield chunk
+
+
+def render_iter(template, form, context=None, **kwargs):
+    '''Render the fields of a form, yielding the output of each in turn.
+
+    `template` is the widget template, and `form` may also be a formset, in
+    which case its management form and each of its forms are rendered.  Any
+    keyword arguments are passed to every field, as with {% fields %}.
+
+    This is suitable for use with a StreamingHttpResponse.
+    '''
+    if isinstance(context, Context):
+        # Rendering is paused between fields, so don't leave our values in a
+        # context which may be used meanwhile
+        context = copy(context)
+    else:
+        context = Context(context)
+
+    index = get_block_index(template, context)
+    forms = form_list(form)
+
+    with form_scope(context, index, forms[0]) as safe_context:
+        plans = ((form, form_plan(safe_context, form)) for form in forms)
+        for chunk in iter_forms(safe_context, plans, kwargs):
+            yield chunk
+
+
+def render_field(template, form, name, context=None, **kwargs):
+    '''Render just one field of a form, as {% field %} would.
+
+    `template` is the widget template, and `name` the name of the field in
+    the form.  Any keyword arguments are passed to the field's block.
+    '''
+    if not isinstance(context, Context):
+        context = Context(context)
+
+    index = get_block_index(template, context)
+    with form_scope(context, index, form) as safe_context:
+        return field(safe_context, name, **kwargs)
@@ -0,0 +1,186 @@
+'''
+A form renderer (Django 1.11+) which renders with the blocks of a widget
+template, instead of a template for each widget.
+
+    FORM_RENDERER = 'formulation.renderers.FormulationRenderer'
+'''
+from django.conf import settings
+from django.forms.renderers import BaseRenderer, DjangoTemplates
+from django.template import Context, TemplateSyntaxError
+from django.utils.encoding import force_text
+from django.utils.functional import cached_property
+from django.utils.safestring import mark_safe
+
+from .blocks import get_block_index
+from .render import render_iter
+from .templatetags.formulation import (
+    dispatch_widget, extra_context, form_scope, render_block,
+    render_field_block,
+)
+
+# Django's widget templates, and the widget class each is for
+WIDGET_TEMPLATES = {
+    'django/forms/widgets/%s.html' % name: widget
+    for name, widget in (
+        ('checkbox', 'CheckboxInput'),
+        ('checkbox_select', 'CheckboxSelectMultiple'),
+        ('clearable_file_input', 'ClearableFileInput'),
+        ('date', 'DateInput'),
+        ('datetime', 'DateTimeInput'),
+        ('email', 'EmailInput'),
+        ('file', 'FileInput'),
+        ('hidden', 'HiddenInput'),
+        ('multiple_hidden', 'MultipleHiddenInput'),
+        ('number', 'NumberInput'),
+        ('password', 'PasswordInput'),
+        ('radio', 'RadioSelect'),
+        ('select', 'Select'),
+        ('select_date', 'SelectDateWidget'),
+        ('splitdatetime', 'SplitDateTimeWidget'),
+        ('splithiddendatetime', 'SplitHiddenDateTimeWidget'),
+        ('text', 'TextInput'),
+        ('textarea', 'Textarea'),
+        ('time', 'TimeInput'),
+        ('url', 'URLInput'),
+    )
+}
+# Rendered with render_iter, given a context with 'form' or 'formset'
+FORM_TEMPLATES = (
+    'django/forms/default.html',
+    'django/forms/div.html',
+    'django/forms/p.html',
+    'django/forms/table.html',
+    'django/forms/ul.html',
+    'django/forms/formsets/',
+)
+FIELD_TEMPLATE = 'django/forms/field.html'
+# Attributes the default blocks output themselves
+OWN_ATTRS = ('id', 'required', 'multiple', 'checked')
+
+
+def widget_values(context):
+    '''The field data for a block, from the context of a Django widget.'''
+    widget = dict(context['widget'])
+    attrs = widget.get('attrs') or {}
+    widget['attrs'] = dict(
+        (key, value) for key, value in attrs.items() if key not in OWN_ATTRS
+    )
+    # The value is already formatted for the widget, as text
+    values = {
+        'widget': widget,
+        'html_name': widget['name'],
+        'name': widget['name'],
+        'value': widget['value'],
+        'id': attrs.get('id'),
+        'id_for_label': attrs.get('id'),
+        'required': widget.get('required', attrs.get('required')),
+        'checked': bool(attrs.get('checked')),
+    }
+
+    if 'optgroups' in widget:
+        # The default blocks don't render option groups, so flatten them
+        choices = []
+        selected = set()
+        display = []
+        for group_name, options, index in widget['optgroups']:
+            for option in options:
+                key = force_text(option['value'])
+                choices.append((key, option['label']))
+                if option['selected']:
+                    selected.add(key)
+                    display.append(option['label'])
+        values.update(
+            choices=tuple(choices),
+            selected=frozenset(selected),
+            display=display if attrs.get('multiple') else
+            (display[0] if display else ''),
+        )
+    return values
+
+
+def widget_block(template_name, context):
+    '''The name of the block for a widget template, if there is one.'''
+    name = WIDGET_TEMPLATES.get(template_name)
+    if name == 'Select' and context['widget'].get('attrs', {}).get('multiple'):
+        name = 'SelectMultiple'
+    return name
+
+
+class FormulationRenderer(BaseRenderer):
+    '''Renders forms, fields and widgets with the blocks of a widget template.
+
+    The template is the `form_template` attribute, or else the
+    FORMULATION_RENDERER_TEMPLATE setting ('formulation/default.form' by
+    default).  Anything it has no block for is rendered by Django's own
+    templates.
+    '''
+    form_template = None
+    fallback_class = DjangoTemplates
+
+    @cached_property
+    def fallback(self):
+        return self.fallback_class()
+
+    def get_form_template(self):
+        if self.form_template is not None:
+            return self.form_template
+        return getattr(
+            settings, 'FORMULATION_RENDERER_TEMPLATE',
+            'formulation/default.form',
+        )
+
+    def get_template(self, template_name):
+        return self.fallback.get_template(template_name)
+
+    def render(self, template_name, context, request=None):
+        if template_name.startswith(FORM_TEMPLATES):
+            form = context.get('form', context.get('formset'))
+            if form is not None:
+                output = self.render_form(form, context, request)
+                if output is not None:
+                    return output
+        elif template_name == FIELD_TEMPLATE and 'field' in context:
+            output = self.render_field(context['field'], request)
+            if output is not None:
+                return output
+        else:
+            block_name = widget_block(template_name, context)
+            if block_name is not None:
+                output = self.render_widget(block_name, context, request)
+                if output is not None:
+                    return output
+        return self.fallback.render(template_name, context, request)
+
+    def scope(self, form, request):
+        context = Context({'request': request})
+        index = get_block_index(self.get_form_template(), context)
+        return form_scope(context, index, form)
+
+    def render_form(self, form, context, request):
+        errors = context.get('errors')
+        output = [force_text(errors)] if errors else []
+        try:
+            output.extend(render_iter(
+                self.get_form_template(), form, {'request': request},
+            ))
+        except TemplateSyntaxError:
+            # Some field has no block
+            return None
+        return mark_safe(''.join(output))
+
+    def render_field(self, bound_field, request):
+        with self.scope(bound_field.form, request) as context:
+            block = dispatch_widget(context, bound_field)
+            if block is None:
+                return None
+            return render_field_block(context, bound_field, block, {})
+
+    def render_widget(self, block_name, widget_context, request):
+        with self.scope(None, request) as context:
+            block = context['formulation'].get_block(block_name)
+            if block is None:
+                return None
+            values = widget_values(widget_context)
+            values['block'] = block
+            with extra_context(context, values):
+                return render_block(context, block)
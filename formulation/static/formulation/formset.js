@@ -0,0 +1,63 @@
+/*
+ * Add forms to a formset rendered with {% formset ... empty_form="template" %}
+ *
+ * The empty form is rendered once, in a <template> element, with __prefix__
+ * where the number of the form goes.  A new form is a copy of it, numbered
+ * from the formset's TOTAL_FORMS, which is then counted up.
+ *
+ * Any element with data-formulation-add="<formset prefix>" adds a form when
+ * clicked, or call formulation.addForm(prefix) yourself.
+ */
+(function (window, document) {
+    'use strict';
+
+    function managementInput(prefix, name) {
+        return document.querySelector(
+            'input[name="' + prefix + '-' + name + '"]'
+        );
+    }
+
+    /*
+     * Add a form to the formset with this prefix, before its template, or at
+     * the end of `container` if given.  Returns the new form's number, or
+     * null if the formset already has as many forms as it may.
+     */
+    function addForm(prefix, container) {
+        var template = document.querySelector(
+            'template[data-formulation-formset="' + prefix + '"]'
+        );
+        var total = managementInput(prefix, 'TOTAL_FORMS');
+        var max = managementInput(prefix, 'MAX_NUM_FORMS');
+        if (!template || !total) {
+            return null;
+        }
+
+        var number = parseInt(total.value, 10) || 0;
+        if (max && max.value && number >= parseInt(max.value, 10)) {
+            return null;
+        }
+
+        // Parsed as a template too, so table rows and the like survive
+        var form = document.createElement('template');
+        form.innerHTML = template.innerHTML.replace(/__prefix__/g, number);
+        if (container) {
+            container.appendChild(form.content);
+        } else {
+            template.parentNode.insertBefore(form.content, template);
+        }
+        total.value = number + 1;
+        return number;
+    }
+
+    document.addEventListener('click', function (event) {
+        var target = event.target.closest &&
+            event.target.closest('[data-formulation-add]');
+        if (target) {
+            event.preventDefault();
+            addForm(target.getAttribute('data-formulation-add'));
+        }
+    });
+
+    window.formulation = window.formulation || {};
+    window.formulation.addForm = addForm;
+}(window, document));
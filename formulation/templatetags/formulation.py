@@ -1,66 +1,132 @@
 
 from contextlib import contextmanager
-from copy import copy
 
-from django import template
+from django import forms, template
 try:
     from django.forms.utils import flatatt
 except ImportError:  # Django 1.5 compatibility
     from django.forms.util import flatatt
-from django.template.loader import get_template
-from django.template.loader_tags import (
-    BlockNode, ExtendsNode, BlockContext, BLOCK_CONTEXT_KEY,
-)
+from django.template.loader_tags import BLOCK_CONTEXT_KEY
+from django.template.base import TextNode, token_kwargs
 from django.utils import six
 from django.utils.encoding import force_text
+from django.utils.functional import Promise
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+from django.utils.translation import get_language
+
+from .. import compiler as compiling, profiling
+from ..analysis import analyser, constant, literal_name
+from ..blocks import get_block_index, resolve_blocks  # NOQA
+from ..caching import (
+    cache_holes, fill_holes, fingerprint, fragment_cache, fragment_key,
+    hole_marker, token_source,
+)
+from ..compiler import Unsupported, compile_block, compiler, string_if_invalid
+from ..fields import FieldData, normalize_choices, normalize_value
+from ..utils import LRUCache, frozen
 
 register = template.Library()
 
+# Maps (template version, field class, widget class, field name) to the name
+# of the block auto_widget settled on, or None if there was none.
+_dispatch_cache = LRUCache(maxsize=4096)
+# Maps (template version, form class, only, exclude, form fields) to a list
+# of (field name, block name, BlockInfo) for {% fields %}
+_plan_cache = LRUCache(maxsize=1024)
+# Maps (template version, block name, ..., choices) to the output of an
+# option block for each choice, see option_key
+_option_cache = LRUCache(maxsize=256)
+# Maps (template version, block name, ..., values read) to the output of a
+# block which reads only static field data, see static_key
+_static_cache = LRUCache(maxsize=4096)
+# Types of values which render the same whenever they're equal
+PLAIN_TYPES = six.string_types + six.integer_types + (
+    float, bool, type(None), Promise,
+    type,  # frozen() keeps the classes of items
+)
+# Names {% options %} sets when rendering an option block
+OPTION_NAMES = frozenset(['val', 'display', 'selected', 'forloop', 'block'])
+MISSING = object()
+# render_context key for choices shared by fields, see form_scope
+CHOICES_KEY = 'formulation-choices'
+
+WIDGET_PATTERNS = (
+    '{field}_{widget}_{name}',
+    '{field}_{name}',
+    '{widget}_{name}',
+    '{field}_{widget}',
+    '{name}',
+    '{widget}',
+    '{field}',
+)
 
-def resolve_blocks(template, context):
-    '''Get all the blocks from this template, accounting for 'extends' tags'''
-    try:
-        blocks = context.render_context[BLOCK_CONTEXT_KEY]
-    except KeyError:
-        blocks = context.render_context[BLOCK_CONTEXT_KEY] = BlockContext()
-
-    # If it's just the name, resolve into template
-    if isinstance(template, six.string_types):
-        template = get_template(template)
-
-    # Add this templates blocks as the first
-    local_blocks = dict(
-        (block.name, block)
-        for block in template.nodelist.get_nodes_by_type(BlockNode)
-    )
-    blocks.add_blocks(local_blocks)
 
-    # Do we extend a parent template?
-    extends = template.nodelist.get_nodes_by_type(ExtendsNode)
-    if extends:
-        # Can only have one extends in a template
-        extends_node = extends[0]
+class extra_context(object):
+    '''Temporarily add some context, and clean up after ourselves.
+
+    The dict itself is pushed (Django 1.8+ would copy it in update()), so it
+    can be changed in place, and isn't evaluated if it's lazy.  However the
+    block is left, the stack is put back as it was.
+    '''
+    __slots__ = ('dicts', 'extra', 'depth')
 
-        # Get the parent, and recurse
-        parent_template = extends_node.get_parent(context)
-        resolve_blocks(parent_template, context)
+    def __init__(self, context, extra):
+        self.dicts = context.dicts
+        self.extra = extra
 
-    return blocks
+    def __enter__(self):
+        self.depth = len(self.dicts)
+        self.dicts.append(self.extra)
+
+    def __exit__(self, *exc_info):
+        del self.dicts[self.depth:]
 
 
 @contextmanager
-def extra_context(context, extra):
-    '''Temporarily add some context, and clean up after ourselves.'''
-    context.update(extra)
-    yield
-    context.pop()
+def form_scope(context, index, form, values=None, choices=None):
+    '''Yield the context, ready to render with the blocks of a widget template.
+
+    Nothing is copied; the block context is pushed onto the render_context,
+    and what the tags need onto the context, and both are put back as they
+    were afterwards.  Fields rendered in it share their normalized choices
+    through `choices`, see formulation.fields.shared_choices.
+    '''
+    blocks = index.block_context()
+
+    render_dicts = context.render_context.dicts
+    depth = len(render_dicts)
+    render_dicts.append({
+        BLOCK_CONTEXT_KEY: blocks,
+        CHOICES_KEY: {} if choices is None else choices,
+    })
+    # Django 1.8+ needs a template to render nodes with
+    bound = getattr(context, 'template', False) is None
+    if bound:
+        context.template = index.template
+
+    extra = {
+        'formulation': blocks,
+        'formulation-form': form,
+        'formulation-index': index,
+    }
+    if values:
+        extra.update(values)
+
+    try:
+        with extra_context(context, extra):
+            yield context
+    finally:
+        del render_dicts[depth:]
+        if bound:
+            context.template = None
 
 
 @register.tag
 def form(parser, token):
     '''Prepare to render a Form, using the specified template.
 
-    {% form "template.form" [form] %}
+    {% form "template.form" [form] [cache=timeout [vary=value]] %}
         {% field "blockname" form.somefield ..... %}
         ...
     {% endform %}
@@ -73,114 +139,698 @@ def form(parser, token):
         raise template.TemplateSyntaxError("%r tag takes at least 1 argument: "
                                            "the widget template" % tag_name)
 
-    try:
+    options = token_kwargs(bits, parser)
+    form = None
+    if bits and not options:
         form = parser.compile_filter(bits.pop(0))
-    except IndexError:
-        form = None
+        options = token_kwargs(bits, parser)
+
+    unknown = set(options) - set(['cache', 'vary'])
+    if bits or unknown:
+        raise template.TemplateSyntaxError(
+            "%r tag received unknown arguments: %s" % (
+                tag_name, bits or unknown))
 
-    nodelist = parser.parse(('endform',))
+    nodelist, tokens = parse_tokens(parser, ('endform',))
     parser.delete_first_token()
 
-    return FormNode(tmpl_name, nodelist, form)
+    source = [token.contents] + token_source(tokens)
+    return FormNode(tmpl_name, nodelist, form, source=source, **options)
+
+
+def parse_tokens(parser, parse_until):
+    '''parser.parse(), also returning the tokens it consumed.'''
+    before = list(parser.tokens)
+    nodelist = parser.parse(parse_until)
+    taken = len(before) - len(parser.tokens)
+    if parser.tokens[:1] == before[taken:taken + 1]:
+        tokens = before[:taken]
+    else:
+        # Newer Django keeps the tokens reversed, and takes from the end
+        tokens = before[len(before) - taken:][::-1]
+    return nodelist, tokens
 
 
 class FormNode(template.Node):
-    def __init__(self, tmpl_name, nodelist, form):
+    def __init__(self, tmpl_name, nodelist, form, cache=None, vary=None,
+                 source=()):
         self.tmpl_name = tmpl_name
+        # A literal name needn't be resolved
+        self.literal_name = literal_name(tmpl_name)
         self.nodelist = nodelist
         self.form = form
+        self.cache = cache
+        self.vary = vary
+        # The tag and its contents, as written, for fingerprint()
+        self.source = source
 
     def render(self, context):
         # Resolve our arguments
-        tmpl_name = self.tmpl_name.resolve(context)
+        tmpl_name = self.literal_name
+        if tmpl_name is None:
+            tmpl_name = self.tmpl_name.resolve(context)
 
         form = self.form
         if form is not None:
             form = form.resolve(context)
 
-        safe_context = copy(context)
-        # Since render_context is derived from BaseContext, a simple copy will
-        # wind up with the same stack of dicts.
-        safe_context.render_context = safe_context.render_context.new({
-            BLOCK_CONTEXT_KEY: BlockContext(),
-        })
+        if profiling.enabled:
+            with profiling.profile_form(tmpl_name, form) as profile:
+                output = self.render_template(
+                    context, tmpl_name, form,
+                )
+                profile.size = len(output)
+            return output
+        return self.render_template(context, tmpl_name, form)
+
+    def render_template(self, context, tmpl_name, form):
+        index = get_block_index(tmpl_name, context)
+
+        if self.cache is not None:
+            timeout = self.cache.resolve(context)
+            if timeout not in (None, False, ''):
+                return self.render_cached(context, index, form, timeout)
 
-        extra = {
-            'formulation': resolve_blocks(tmpl_name, safe_context),
-            'formulation-form': form,
-        }
+        return self.render_form(context, index, form)
 
+    def render_form(self, context, index, form, values=None):
         # Render our children
-        with extra_context(safe_context, extra):
+        with form_scope(context, index, form, values) as safe_context:
             return self.nodelist.render(safe_context)
 
+    def render_cached(self, context, index, form, timeout):
+        '''Render from the fragment cache, filling in the holes.'''
+        holes = dict(
+            (name, context[name])
+            for name in cache_holes()
+            if name in context
+        )
+        vary = self.vary
+        if vary is not None:
+            vary = vary.resolve(context)
+
+        key = fragment_key(self, index, form, vary, holes)
+        if key is None:
+            return self.render_form(context, index, form)
+        cache = fragment_cache()
+        content = cache.get(key)
+        if content is None:
+            markers = dict((name, hole_marker(name)) for name in holes)
+            content = force_text(
+                self.render_form(context, index, form, markers))
+            cache.set(key, content, timeout)
+        return fill_holes(content, holes)
+
+    def fingerprint(self):
+        try:
+            return self._fingerprint
+        except AttributeError:
+            pass
+        self._fingerprint = fingerprint(*self.source)
+        return self._fingerprint
 
-@register.simple_tag(takes_context=True)
-def field(context, field, widget=None, **kwargs):
-    if isinstance(field, six.string_types):
-        field = context['formulation-form'][field]
 
-    field_data = {
-        'form_field': field,
-        'id': field.auto_id,
-        'widget_type': field.field.widget.__class__.__name__,
-        'field_class': field.field.__class__.__name__,
-    }
+@register.tag
+def formset(parser, token):
+    '''Render every form of a formset, using the specified template.
+
+    {% formset "template.form" formset [empty_form=True|"template"] %}
+        {% field form.somefield %}
+        ...
+    {% endformset %}
+
+    The management form is rendered first, then the contents are rendered
+    once for each form, as `form`.  If there are no contents, all the fields
+    of each form are rendered.
 
-    for attr in ('css_classes', 'errors', 'field', 'form', 'help_text',
-                 'html_name', 'id_for_label', 'label', 'name', 'value',):
-        field_data[attr] = getattr(field, attr)
-
-    for attr in ('choices', 'widget', 'required'):
-        field_data[attr] = getattr(field.field, attr, None)
-
-    if field_data['choices']:
-        field_data['display'] = dict(field.field.choices).get(field.value, '')
-        field_data['choices'] = [
-            (force_text(k), v)
-            for k, v in field_data['choices']
-        ]
-
-        # Normalize the value [django.forms.widgets.Select.render_options]
-        value = field_data['value']()
-        if value is None:  # don't force_text these
-            field_data['value'] = value
-        elif isinstance(value, (list, tuple)):
-            field_data['value'] = [force_text(v) for v in value]
+    With empty_form="template", the empty form is rendered inside a
+    <template> element, for formulation/formset.js to add rows from.
+    '''
+    bits = token.split_contents()
+    tag_name = bits.pop(0)  # Remove the tag name
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(
+            "%r tag takes at least 2 arguments: the widget template and the "
+            "formset" % tag_name)
+    tmpl_name = parser.compile_filter(bits.pop(0))
+    formset = parser.compile_filter(bits.pop(0))
+
+    options = token_kwargs(bits, parser)
+    unknown = set(options) - set(['empty_form'])
+    if bits or unknown:
+        raise template.TemplateSyntaxError(
+            "%r tag received unknown arguments: %s" % (
+                tag_name, bits or unknown))
+
+    nodelist = parser.parse(('endformset',))
+    parser.delete_first_token()
+
+    return FormsetNode(tmpl_name, nodelist, formset, **options)
+
+
+class FormsetNode(template.Node):
+    def __init__(self, tmpl_name, nodelist, formset, empty_form=None):
+        self.tmpl_name = tmpl_name
+        self.nodelist = nodelist
+        self.formset = formset
+        self.empty_form = empty_form
+        self.auto_fields = not any(
+            not isinstance(node, TextNode) or node.s.strip()
+            for node in nodelist
+        )
+
+    def render(self, context):
+        tmpl_name = self.tmpl_name.resolve(context)
+        formset = self.formset.resolve(context)
+        empty_form = self.empty_form
+        if empty_form is not None:
+            empty_form = empty_form.resolve(context)
+
+        if profiling.enabled:
+            with profiling.profile_form(tmpl_name, formset) as profile:
+                output = self.render_formset(
+                    context, tmpl_name, formset, empty_form,
+                )
+                profile.size = len(output)
+            return output
+        return self.render_formset(context, tmpl_name, formset, empty_form)
+
+    def render_formset(self, context, tmpl_name, formset, empty_form):
+        index = get_block_index(tmpl_name, context)
+        management_form = formset.management_form
+        with form_scope(context, index, management_form) as safe_context:
+            output = [self.render_management(safe_context, management_form)]
+
+            prototype = empty_form == 'template'
+            forms = list(formset)
+            if empty_form and not prototype:
+                forms.append(formset.empty_form)
+
+            # One dict is reused for every row
+            row = {'formset': formset}
+            with extra_context(safe_context, row):
+                for form in forms:
+                    row['form'] = row['formulation-form'] = form
+                    output.append(self.render_row(safe_context, form))
+                if prototype:
+                    form = formset.empty_form
+                    row['form'] = row['formulation-form'] = form
+                    output.append(format_html(
+                        '<template data-formulation-formset="{0}">'
+                        '{1}</template>',
+                        formset.prefix, self.render_row(safe_context, form),
+                    ))
+
+        return mark_safe(''.join(output))
+
+    def render_management(self, context, form):
+        if not has_blocks(context, form):
+            # The widget template doesn't handle hidden inputs
+            return force_text(form)
+        return fields(context, form)
+
+    def render_row(self, context, form):
+        if self.auto_fields:
+            return fields(context, form)
+        return self.nodelist.render(context)
+
+
+def tag_arguments(parser, token, min_args, max_args):
+    '''Parse the arguments of a tag as simple_tag would, into a list and a
+    dict of FilterExpressions.'''
+    bits = token.split_contents()
+    tag_name = bits.pop(0)
+    args = []
+    kwargs = {}
+    for bit in bits:
+        kwarg = token_kwargs([bit], parser)
+        if kwarg:
+            name, value = kwarg.popitem()
+            if name in kwargs:
+                raise template.TemplateSyntaxError(
+                    "%r received multiple values for keyword argument %r" %
+                    (tag_name, name)
+                )
+            kwargs[name] = value
+        elif kwargs:
+            raise template.TemplateSyntaxError(
+                "%r received a positional argument after keyword arguments" %
+                tag_name
+            )
         else:
-            field_data['value'] = force_text(value)
+            args.append(parser.compile_filter(bit))
+    if not min_args <= len(args) <= max_args:
+        raise template.TemplateSyntaxError(
+            "%r tag takes %s positional arguments" % (
+                tag_name,
+                min_args if min_args == max_args else
+                '%d to %d' % (min_args, max_args),
+            )
+        )
+    return args, kwargs
+
+
+class ArgumentsNode(template.Node):
+    '''A tag with arguments, whose constant keyword arguments are resolved
+    when it's parsed.'''
+    def __init__(self, args, kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        self.constants = {}
+        self.variables = []
+        for key, value in six.iteritems(kwargs):
+            const = constant(value, MISSING)
+            if const is MISSING:
+                self.variables.append((key, value))
+            else:
+                self.constants[key] = const
+
+    def resolve_kwargs(self, context):
+        values = dict(self.constants)
+        for key, value in self.variables:
+            values[key] = value.resolve(context)
+        return values
+
+
+@register.tag('field')
+def do_field(parser, token):
+    '''Render a field of the form with its auto-widget, or a named block.
+
+    {% field form.somefield ["blockname"] [key=value...] %}
+    {% field "somefield" ... %}
+    '''
+    return FieldNode(*tag_arguments(parser, token, 1, 2))
 
-    # Allow supplied values to override field data
-    field_data.update(kwargs)
+
+class FieldNode(ArgumentsNode):
+    def __init__(self, args, kwargs):
+        super(FieldNode, self).__init__(args, kwargs)
+        self.field = args[0]
+        self.widget = args[1] if len(args) > 1 else None
+        self.widget_name = None if self.widget is None else \
+            literal_name(self.widget)
+
+    def render(self, context):
+        widget = self.widget_name
+        if widget is None and self.widget is not None:
+            widget = self.widget.resolve(context)
+        return field_block(
+            context, self.field.resolve(context), widget,
+            self.resolve_kwargs(context),
+        )
+
+
+def field(context, field, widget=None, **kwargs):
+    '''{% field %}, for use from Python.'''
+    return field_block(context, field, widget, kwargs)
+
+
+def field_block(context, field, widget, values):
+    '''Render a field with its auto-widget, or the block named widget.'''
+    if isinstance(field, six.string_types):
+        field = context['formulation-form'][field]
 
     if widget is None:
-        widgets = auto_widget(field)
+        block = dispatch_widget(context, field)
     else:
-        widgets = [widget]
-    for name in widgets:
-        block = context['formulation'].get_block(name)
-        if block is not None:
-            break
+        block = context['formulation'].get_block(widget)
 
     if block is None:
         raise template.TemplateSyntaxError(
             "No widget for field: %s (%r) [Tried: %s]" % (
                 field.name,
                 field.field,
-                widgets
+                [widget] if widget else auto_widget(field),
             )
         )
 
+    return render_field_block(context, field, block, values)
+
+
+def render_field_block(context, field, block, values, info=MISSING):
+    '''Render a block with the field's data exploded into the context.'''
+    if info is MISSING:
+        info = block_info(context, block)
+    # Allow supplied values to override field data
+    field_data = FieldData(
+        field, values, info, context.render_context.get(CHOICES_KEY),
+    )
     field_data['block'] = block
+    start = profiling.timer() if profiling.enabled else None
     with extra_context(context, field_data):
-        return block.render(context)
+        output = render_static(context, block, info)
+    if start is not None:
+        profile_field(field, block, field_data, start, output)
+    return output
+
+
+def profile_field(field, block, field_data, start, output):
+    duration = profiling.timer() - start
+    candidates = auto_widget(field)
+    if block.name in candidates:
+        candidates = candidates.index(block.name) + 1
+    else:
+        candidates = None
+    choices = dict.get(field_data, 'choices')
+    profiling.add(profiling.Record(
+        'field', field.html_name, block.name, duration, len(output),
+        candidates, None if choices is None else len(choices),
+    ))
+
+
+def _names(value):
+    '''Accept a list of field names, or a comma separated string of them.'''
+    if not value:
+        return ()
+    if isinstance(value, six.string_types):
+        value = value.split(',')
+    return tuple(name.strip() for name in value)
+
+
+def field_plan(context, form, only=(), exclude=()):
+    '''Return [(field name, block name, BlockInfo), ...] for a form.
+
+    Plans are cached per widget template and form fields.
+    '''
+    index = context['formulation-index']
+    key = (
+        index.version,
+        form.__class__,
+        only,
+        exclude,
+        tuple(
+            (name, field.__class__, field.widget.__class__)
+            for name, field in form.fields.items()
+        ),
+    )
+    plan = _plan_cache.get(key) if index.version else None
+    if plan is not None:
+        return plan
+
+    plan = []
+    for name in only or form.fields:
+        if name in exclude:
+            continue
+        bound_field = form[name]
+        block = dispatch_widget(context, bound_field)
+        if block is None:
+            raise template.TemplateSyntaxError(
+                "No widget for field: %s (%r) [Tried: %s]" % (
+                    name, bound_field.field, auto_widget(bound_field),
+                )
+            )
+        plan.append((name, block.name, block_info(context, block)))
+
+    if index.version:
+        _plan_cache.set(key, plan)
+    return plan
+
+
+def has_blocks(context, form):
+    '''Whether the widget template has a block for every field of a form.'''
+    return all(
+        dispatch_widget(context, form[name]) is not None
+        for name in form.fields
+    )
 
 
 @register.simple_tag(takes_context=True)
+def fields(context, form=None, only=None, exclude=None, **kwargs):
+    '''Render many fields of a form, each with its auto-widget.
+
+    {% fields form [only="a,b"] [exclude=list] [key=value...] %}
+    '''
+    if form is None:
+        form = context['formulation-form']
+    plan = field_plan(context, form, _names(only), _names(exclude))
+
+    return mark_safe(''.join(iter_fields(context, form, plan, kwargs)))
+
+
+def iter_fields(context, form, plan, values):
+    '''Render the fields of a form by a plan, yielding each in turn.'''
+    blocks = context['formulation']
+    for name, block_name, info in plan:
+        yield render_field_block(
+            context, form[name], blocks.get_block(block_name), values, info,
+        )
+
+
+@register.tag('use')
+def do_use(parser, token):
+    '''Render a block of the widget template.
+
+    {% use "blockname" [key=value...] %}
+    '''
+    return UseNode(*tag_arguments(parser, token, 1, 1))
+
+
+class UseNode(ArgumentsNode):
+    def __init__(self, args, kwargs):
+        super(UseNode, self).__init__(args, kwargs)
+        self.widget = args[0]
+        self.widget_name = literal_name(self.widget)
+
+    def render(self, context):
+        widget = self.widget_name
+        if widget is None:
+            widget = self.widget.resolve(context)
+        return use_block(context, widget, self.resolve_kwargs(context))
+
+
 def use(context, widget, **kwargs):
-    kwargs['block'] = block = context['formulation'].get_block(widget)
-    with extra_context(context, kwargs):
-        return block.render(context)
+    '''{% use %}, for use from Python.'''
+    return use_block(context, widget, kwargs)
+
+
+def use_block(context, widget, values):
+    '''Render a block of the widget template, with values added to the
+    context.'''
+    blocks = context['formulation']
+    values['block'] = block = blocks.get_block(widget)
+    index = blocks.index
+    info = None if index.analysis is None else index.analysis.get(block.name)
+    start = profiling.timer() if profiling.enabled else None
+    with extra_context(context, values):
+        output = render_static(context, block, info, index)
+    if start is not None:
+        profiling.add(profiling.Record(
+            'block', block.name, block.name, profiling.timer() - start,
+            len(output),
+        ))
+    return output
+
+
+def render_block(context, block):
+    '''Render a block of the widget template, with its compiled function if
+    compiling is on, and it has one.'''
+    if compiling.enabled:
+        index = context['formulation-index']
+        if index.version:
+            try:
+                func = index.compiled[block]
+            except KeyError:
+                func = index.compiled[block] = compile_block(
+                    block, string_if_invalid(index.template),
+                    index.analysis.get(block.name),
+                )
+            if func is not None:
+                return func(context)
+    return block.render(context)
+
+
+def render_static(context, block, info, index=None):
+    '''render_block, reusing the output of blocks which only read static
+    field data, such as labels and help text.'''
+    key = static_key(context, block, info, index)
+    if key is None:
+        return render_block(context, block)
+    output = _static_cache.get(key)
+    if output is None:
+        output = render_block(context, block)
+        _static_cache.set(key, output)
+    return output
+
+
+def static_key(context, block, info, index=None):
+    '''The cache key for the output of a block, if it only reads field data
+    which is the same for every form of the class, and other plain values.
+    '''
+    if info is None or not info.static:
+        return None
+    if index is None:
+        index = context['formulation-index']
+    if not index.version:
+        return None
+    values = []
+    for name in sorted(info.references):
+        value = frozen(context.get(name))
+        if not _plain(value):
+            return None
+        # A safe string renders differently to an equal one which isn't
+        values.append((name, value.__class__, value))
+    return (
+        index.version,
+        block.name,
+        get_language(),
+        context.autoescape,
+        tuple(values),
+    )
+
+
+def _plain(value):
+    if isinstance(value, tuple):
+        return all(_plain(item) for item in value)
+    return isinstance(value, PLAIN_TYPES)
+
+
+@register.simple_tag(takes_context=True)
+def options(context, widget, choices=None, selected=None):
+    '''Render a block for each of a field's choices.
+
+    {% options "blockname" [choices=...] [selected=...] %}
+
+    The block is rendered with val, display, selected and forloop in the
+    context.  Its output for each choice is kept, so rendering the same
+    choices again only has to pick the selected or unselected version.
+    '''
+    if choices is None:
+        choices = context.get('choices') or ()
+    else:
+        choices = normalize_choices(choices)[0]
+    if selected is None:
+        selected = context.get('selected') or frozenset()
+    elif not isinstance(selected, (set, frozenset)):
+        selected = normalize_value(selected)
+        if not isinstance(selected, list):
+            selected = () if selected is None else [selected]
+        selected = frozenset(selected)
+    block = context['formulation'].get_block(widget)
+
+    key = option_key(context, block, choices)
+    rendered = _option_cache.get(key) if key else None
+    if rendered is None:
+        # [unselected, selected] output for each choice
+        rendered = [[None, None] for choice in choices]
+        if key:
+            _option_cache.set(key, rendered)
+
+    output = []
+    count = len(rendered)
+    values = {'block': block}
+    with extra_context(context, values):
+        for counter0, (val, display) in enumerate(choices):
+            is_selected = val in selected
+            html = rendered[counter0][is_selected]
+            if html is None:
+                values.update(val=val, display=display, selected=is_selected)
+                values['forloop'] = {
+                    'counter0': counter0,
+                    'counter': counter0 + 1,
+                    'first': counter0 == 0,
+                    'last': counter0 == count - 1,
+                }
+                html = rendered[counter0][is_selected] = \
+                    render_block(context, block)
+            output.append(html)
+    return mark_safe(''.join(output))
+
+
+def option_key(context, block, choices):
+    '''The cache key for the output of an option block, if it can be cached.
+
+    That's only when we know everything else the block reads, and it's all
+    plain values, which are equal whenever they render the same.  Objects
+    compared by identity, such as form_field, would never match again.
+    '''
+    index = context['formulation-index']
+    info = block_info(context, block)
+    if not index.version or info is None or not info.complete or \
+            not info.cacheable:
+        return None
+    choices = frozen(choices)
+    if not _plain(choices):
+        return None
+    values = []
+    for name in sorted(info.references - OPTION_NAMES):
+        value = frozen(context.get(name))
+        if not _plain(value):
+            return None
+        values.append((name, value.__class__, value))
+    return (
+        index.version,
+        block.name,
+        get_language(),
+        context.autoescape,
+        choices,
+        tuple(values),
+    )
+
+
+def tag_node(name, func):
+    '''What to register the analyser of a simple_tag for: its node class, or
+    on Django 1.9+, where simple tags share one, its function.'''
+    keywords = getattr(register.tags[name], 'keywords', None)
+    return func if keywords is None else keywords['node_class']
+
+
+@analyser(tag_node('options', options))
+def analyse_options(node, scan):
+    name = literal_name(node.args[0])
+    if name is None:
+        scan.complete = False
+    else:
+        scan.block(name, OPTION_NAMES)
+    for name in ('choices', 'selected'):
+        if name not in node.kwargs:
+            scan.references.add(name)
+    scan.expressions(*node.args[1:])
+    scan.expressions(*node.kwargs.values())
+
+
+@analyser(UseNode)
+def analyse_use(node, scan):
+    if node.widget_name is None:
+        scan.complete = False
+        scan.expressions(node.widget)
+    else:
+        scan.block(node.widget_name, set(node.kwargs) | {'block'})
+    scan.expressions(*node.kwargs.values())
+
+
+@compiler(UseNode)
+def compile_use(node, code):
+    if node.widget_name is None:
+        raise Unsupported(node)
+    values = [
+        '%s: %s' % (code.const(key), code.const(value))
+        for key, value in six.iteritems(node.constants)
+    ]
+    values.extend(
+        '%s: %s' % (code.const(key), code.expression(value))
+        for key, value in node.variables
+    )
+    code.output('%s(context, %s, {%s})' % (
+        code.const(use_block), code.const(node.widget_name), ', '.join(values),
+    ))
+
+
+@analyser(FieldNode)
+@analyser(tag_node('fields', fields))
+def analyse_field(node, scan):
+    # The block it renders reads another field's data, perhaps found by name
+    # in the form being rendered
+    scan.references.add('formulation-form')
+    scan.expressions(*node.args)
+    scan.expressions(*node.kwargs.values())
+
+
+def block_info(context, block):
+    '''The BlockInfo for a block of the current widget template, if known.'''
+    analysis = context['formulation-index'].analysis
+    if analysis is None:
+        return None
+    return analysis.get(block.name)
 
 
 @register.filter
@@ -188,25 +838,68 @@ def flat_attrs(attrs):
     return flatatt(attrs)
 
 
+def dispatch_widget(context, field):
+    '''Find the block auto_widget would pick for this field.
+
+    The chosen block name (or the lack of one) is remembered per template and
+    field/widget class, so the candidates are only searched once.
+    '''
+    blocks = context['formulation']
+    version = context['formulation-index'].version
+    key = (
+        version,
+        field.field.__class__,
+        field.field.widget.__class__,
+        field.name,
+    )
+    name = _dispatch_cache.get(key, MISSING) if version else MISSING
+    if name is not MISSING:
+        if name is None:
+            return None
+        block = blocks.get_block(name)
+        if block is not None:
+            return block
+
+    for name in auto_widget(field):
+        block = blocks.get_block(name)
+        if block is not None:
+            break
+    else:
+        name = block = None
+
+    if version:
+        _dispatch_cache.set(key, name)
+    return block
+
+
+def _class_names(klass, base):
+    '''Names of klass and its ancestors, stopping short of base.'''
+    names = [
+        cls.__name__
+        for cls in klass.__mro__
+        if issubclass(cls, base) and cls is not base
+    ]
+    return names or [klass.__name__]
+
+
 @register.filter
 def auto_widget(field):
-    '''Return a list of widget names for the provided field.'''
-    # Auto-detect
-    info = {
-        'widget': field.field.widget.__class__.__name__,
-        'field': field.field.__class__.__name__,
-        'name': field.name,
-    }
+    '''Return a list of widget names for the provided field.
 
-    return [
-        fmt.format(**info)
-        for fmt in (
-            '{field}_{widget}_{name}',
-            '{field}_{name}',
-            '{widget}_{name}',
-            '{field}_{widget}',
-            '{name}',
-            '{widget}',
-            '{field}',
-        )
-    ]
+    The patterns are tried for the widget and field classes first, then for
+    each of their ancestors, so a subclass of TextInput will fall back to the
+    TextInput block.
+    '''
+    widgets = _class_names(field.field.widget.__class__, forms.Widget)
+    fields = _class_names(field.field.__class__, forms.Field)
+
+    names = []
+    for widget in widgets:
+        for field_class in fields:
+            for fmt in WIDGET_PATTERNS:
+                name = fmt.format(
+                    widget=widget, field=field_class, name=field.name,
+                )
+                if name not in names:
+                    names.append(name)
+    return names
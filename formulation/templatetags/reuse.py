@@ -1,34 +1,107 @@
-
 from django import template
+from django.template.loader_tags import BLOCK_CONTEXT_KEY
+
+from ..analysis import literal_name
+from ..blocks import template_chain
+from .formulation import ArgumentsNode, extra_context, tag_arguments
 
 register = template.Library()
 
 
-@register.simple_tag(takes_context=True)
-def reuse(context, block_list, **kwargs):
+@register.tag('reuse')
+def do_reuse(parser, token):
     '''
     Allow reuse of a block within a template.
 
     {% reuse '_myblock' foo=bar %}
     {% reuse list_of_block_names .... %}
     '''
-    # This must be inline to avoid circular import
-    from django.template.loader_tags import BLOCK_CONTEXT_KEY
-    block_context = context.render_context[BLOCK_CONTEXT_KEY]
+    args, kwargs = tag_arguments(parser, token, 1, 1)
+    return ReuseNode(args, kwargs)
+
+
+class ReuseNode(ArgumentsNode):
+    def __init__(self, args, kwargs):
+        super(ReuseNode, self).__init__(args, kwargs)
+        self.block_list = args[0]
+        self.block_name = literal_name(self.block_list)
+        # (template, its blocks by name) for the template last rendered
+        self.registry = None
+
+    def render(self, context):
+        block_list = self.block_name
+        if block_list is None:
+            block_list = self.block_list.resolve(context)
+
+        block = find_block(context, block_list, self.template_blocks(context))
+        if block is None:
+            return ''
+
+        with extra_context(context, self.resolve_kwargs(context)):
+            return block.render(context)
+
+    def template_blocks(self, context):
+        '''The blocks of the template being rendered, and those it extends.
 
+        Found the first time a template is rendered, and kept until another
+        is.  None if they can't be told: before Django 1.8, which doesn't say
+        which template is being rendered, when the parent template is
+        chosen by a variable, or when this tag isn't in the template, but
+        in one it includes.
+        '''
+        template = getattr(context, 'template', None)
+        if template is None:
+            return None
+        registry = self.registry
+        if registry is not None and registry[0] is template:
+            return registry[1]
+
+        blocks = {}
+        ours = False
+        static = True
+        for tmpl, local_blocks, static in template_chain(template, context):
+            for name, block in local_blocks.items():
+                # Blocks of templates which extend others take precedence
+                blocks.setdefault(name, block)
+            ours = ours or self in tmpl.nodelist.get_nodes_by_type(ReuseNode)
+        if not (static and ours):
+            return None
+        self.registry = (template, blocks)
+        return blocks
+
+
+def find_block(context, block_list, blocks=None):
+    '''Find the first block of a name in block_list.
+
+    It's looked for in `blocks`, or if that's None, in the blocks of the
+    template being rendered, if it extends another.
+    '''
     if not isinstance(block_list, list):
         block_list = [block_list]
 
+    if blocks is None:
+        block_context = context.render_context.get(BLOCK_CONTEXT_KEY)
+        if block_context is None:
+            return None
+        for name in block_list:
+            block = block_context.get_block(name)
+            if block is not None:
+                return block
+        return None
+
     for name in block_list:
-        block = block_context.get_block(name)
+        block = blocks.get(name)
         if block is not None:
-            break
+            return block
+    return None
+
 
+def reuse(context, block_list, **kwargs):
+    '''{% reuse %}, for use from Python, in a template which extends another.
+    '''
+    block = find_block(context, block_list)
     if block is None:
         return ''
 
-    # Replace this with "with context.update()" when 1.7 lands
-    context.update(kwargs)
-    content = block.render(context)
-    context.pop()
-    return content
+    with extra_context(context, kwargs):
+        return block.render(context)
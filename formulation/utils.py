@@ -0,0 +1,78 @@
+from collections import OrderedDict
+from threading import Lock
+
+try:
+    from django.core.signals import setting_changed
+except ImportError:  # Django < 1.8
+    from django.test.signals import setting_changed
+
+_caches = []
+
+
+class LRUCache(object):
+    '''A small, thread-safe, size bounded mapping.
+
+    The least recently used entry is discarded when `maxsize` is exceeded.
+    '''
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.lock = Lock()
+        _caches.append(self)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def get(self, key, default=None):
+        with self.lock:
+            try:
+                value = self.data.pop(key)
+            except KeyError:
+                return default
+            self.data[key] = value
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.data.pop(key, None)
+            self.data[key] = value
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+
+def frozen(value):
+    '''A hashable version of value, for use in a cache key.
+
+    Containers keep their class, and their items' classes, so a list and a
+    tuple, or a safe string and a plain one, don't freeze equal.
+    '''
+    if isinstance(value, dict):
+        return (value.__class__, tuple(sorted(
+            (k, (v.__class__, frozen(v))) for k, v in value.items()
+        )))
+    if isinstance(value, (list, tuple)):
+        return (value.__class__, tuple(
+            (v.__class__, frozen(v)) for v in value
+        ))
+    return value
+
+
+def clear_caches():
+    '''Empty every cache formulation keeps.'''
+    for cache in _caches:
+        cache.clear()
+
+
+def _setting_changed(sender, setting, **kwargs):
+    if setting.startswith('TEMPLATE'):
+        clear_caches()
+
+
+setting_changed.connect(_setting_changed)
@@ -0,0 +1,62 @@
+'''
+Inline validation of a single field, for views which show a form.
+'''
+from collections import OrderedDict
+
+from django.http import HttpResponse, HttpResponseBadRequest
+try:
+    from django.forms.utils import ErrorDict
+except ImportError:  # Django 1.5 compatibility
+    from django.forms.util import ErrorDict
+
+from .render import render_field
+
+
+def clean_field(form, name):
+    '''Validate just one field of a bound form.
+
+    Afterwards, form.errors has only that field's errors.  The form's clean()
+    method isn't called, as it may need the other fields.
+    '''
+    fields = form.fields
+    form.fields = OrderedDict([(name, fields[name])])
+    try:
+        form._errors = ErrorDict()
+        form.cleaned_data = {}
+        form._clean_fields()
+    finally:
+        form.fields = fields
+    return name not in form.errors
+
+
+class FieldValidationMixin(object):
+    '''Lets a FormView validate and re-render one field of its form.
+
+    A POST which names a field in `validate_field_param` is answered with
+    just that field, rendered with `field_template` after validating only it,
+    instead of processing the whole form.
+    '''
+    field_template = 'formulation/default.form'
+    validate_field_param = 'formulation-field'
+
+    def post(self, request, *args, **kwargs):
+        name = request.POST.get(self.validate_field_param)
+        if name is None:
+            return super(FieldValidationMixin, self).post(
+                request, *args, **kwargs
+            )
+        form = self.get_form(self.get_form_class())
+        if name not in form.fields:
+            return HttpResponseBadRequest()
+        clean_field(form, name)
+        return self.field_response(form, name)
+
+    def get_field_context(self, form, name):
+        '''The context to render the field in.'''
+        return {'request': self.request, 'form': form}
+
+    def field_response(self, form, name):
+        return HttpResponse(render_field(
+            self.field_template, form, name,
+            self.get_field_context(form, name),
+        ))
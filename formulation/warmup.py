@@ -0,0 +1,121 @@
+'''
+Load and index widget templates ahead of time, and check forms against them.
+'''
+import os
+from collections import namedtuple
+
+from django.conf import settings
+from django.template import Context, TemplateDoesNotExist, TemplateSyntaxError
+
+from .blocks import get_block_index
+from .templatetags.formulation import (
+    auto_widget, dispatch_widget, field_plan, form_scope,
+)
+
+try:
+    from django.utils.module_loading import import_string
+except ImportError:  # Django < 1.7
+    from importlib import import_module
+
+    def import_string(dotted_path):
+        '''Import the attribute of a module named by a dotted path.'''
+        module_path, name = dotted_path.rsplit('.', 1)
+        return getattr(import_module(module_path), name)
+
+
+class Problem(namedtuple('Problem', 'template form field message')):
+    '''form and field are None for problems with the template itself.'''
+    __slots__ = ()
+
+    def __str__(self):
+        if self.form is None:
+            return '%s: %s' % (self.template, self.message)
+        name = '%s.%s' % (self.form.__module__, self.form.__name__)
+        if self.field is not None:
+            name = '%s.%s' % (name, self.field)
+        return '%s: %s: %s' % (self.template, name, self.message)
+
+
+def template_dirs():
+    '''All the directories templates are loaded from.'''
+    try:
+        from django.template import engines
+    except ImportError:  # Django < 1.8
+        from django.template.loaders.app_directories import app_template_dirs
+        return list(settings.TEMPLATE_DIRS) + list(app_template_dirs)
+    dirs = []
+    for engine in engines.all():
+        dirs.extend(getattr(engine, 'template_dirs', ()))
+    return dirs
+
+
+def find_templates(suffix='.form'):
+    '''The names of every template ending with suffix, in loader order.'''
+    names = []
+    for template_dir in template_dirs():
+        for root, dirs, files in os.walk(template_dir):
+            for filename in sorted(files):
+                if not filename.endswith(suffix):
+                    continue
+                path = os.path.join(root, filename)
+                name = os.path.relpath(path, template_dir).replace(os.sep, '/')
+                if name not in names:
+                    names.append(name)
+    return names
+
+
+def configured_forms():
+    '''settings.FORMULATION_WARM_UP_FORMS: {template: [form path, ...]}'''
+    return getattr(settings, 'FORMULATION_WARM_UP_FORMS', {})
+
+
+def check_form(template, index, form_class):
+    '''Resolve the auto-widget of each field, yielding a Problem for those
+    without a block.  If there are none, the form's field plan is made.'''
+    try:
+        form = form_class()
+    except Exception as exc:
+        yield Problem(template, form_class, None,
+                      'Could not be created without arguments: %s' % exc)
+        return
+
+    with form_scope(Context(), index, form) as context:
+        missing = False
+        for name in form.fields:
+            bound_field = form[name]
+            if dispatch_widget(context, bound_field) is None:
+                missing = True
+                yield Problem(
+                    template, form_class, name, 'No widget block [Tried: %s]' %
+                    ', '.join(auto_widget(bound_field)),
+                )
+        if not missing:
+            field_plan(context, form)
+
+
+def warm_up(templates=None, forms=None):
+    '''Index widget templates, and pre-resolve the widgets of forms.
+
+    `templates` defaults to every .form template, and `forms` (a dict of
+    template name to a list of form classes or their paths) to the
+    FORMULATION_WARM_UP_FORMS setting.  Returns a list of Problems.
+    '''
+    if forms is None:
+        forms = configured_forms()
+    if templates is None:
+        templates = find_templates()
+    templates = list(templates)
+    templates.extend(name for name in forms if name not in templates)
+
+    problems = []
+    for template in templates:
+        try:
+            index = get_block_index(template, Context())
+        except (TemplateDoesNotExist, TemplateSyntaxError) as exc:
+            problems.append(Problem(template, None, None, repr(exc)))
+            continue
+        for form_class in forms.get(template, ()):
+            if not isinstance(form_class, type):
+                form_class = import_string(form_class)
+            problems.extend(check_form(template, index, form_class))
+    return problems
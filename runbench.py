@@ -0,0 +1,350 @@
+#!/usr/bin/env python
+'''
+Benchmarks of formulation's rendering, compared with Django's own.
+
+    ./runbench.py [--number N] [--json results.json] [--compare old.json]
+                  [--threshold 1.2] [--compile] [name ...]
+
+With --compare, exits with an error if any benchmark is slower than in the
+results given by more than the threshold.
+'''
+import argparse
+import gc
+import json
+import os
+import sys
+import timeit
+
+from django.conf import settings
+
+import django
+
+try:
+    import tracemalloc
+except ImportError:  # Python < 3.4
+    tracemalloc = None
+
+
+if not settings.configured:
+    settings.configure(
+        # Compile widget blocks, see formulation.compiler
+        FORMULATION_COMPILE='--compile' in sys.argv,
+        DATABASES={
+            'default': {
+                'ENGINE': 'django.db.backends.sqlite3',
+            }
+        },
+        INSTALLED_APPS=(
+            'formulation',
+        ),
+        MIDDLEWARE_CLASSES=[],
+    )
+
+if hasattr(django, 'setup'):
+    django.setup()
+
+from django import forms  # NOQA
+from django.template import Context, Template  # NOQA
+
+from formulation.blocks import get_block_index, resolve_blocks  # NOQA
+from formulation.templatetags.formulation import (  # NOQA
+    _dispatch_cache, dispatch_widget, form_scope,
+)
+from tests.utils import get_template, setup_templates  # NOQA
+
+DEFAULT_FORM = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    'formulation', 'templates', 'formulation', 'default.form',
+)
+EXTENDS_DEPTH = 20
+USE_DEPTH = 10
+
+TEMPLATES = {
+    'bench.form': '''{% load formulation %}
+{% block TextInput %}\
+<input name="{{ html_name }}" value="{{ value|default:"" }}">{% endblock %}
+''',
+    'chain0.form': '{% block TextInput %}0{% endblock %}',
+    'nested.form': '{% load formulation %}' + ''.join(
+        '{%% block use%d %%}{%% use "use%d" %%}{%% endblock %%}' % (i, i + 1)
+        for i in range(USE_DEPTH)
+    ) + '{%% block use%d %%}{{ value }}{%% endblock %%}' % USE_DEPTH,
+    'reuse_base.html': '{% block content %}{% endblock %}',
+    'reuse.html': '{% extends "reuse_base.html" %}{% load reuse %}' + ''.join(
+        '{%% block reuse%d %%}{%% reuse "reuse%d" %%}'
+        '{%% endblock %%}' % (i, i + 1)
+        for i in range(USE_DEPTH)
+    ) + '{%% block reuse%d %%}{{ value }}{%% endblock %%}' % USE_DEPTH + (
+        '{% block content %}{% reuse "reuse0" %}{% endblock %}'
+    ),
+}
+for depth in range(1, EXTENDS_DEPTH + 1):
+    TEMPLATES['chain%d.form' % depth] = (
+        '{%% extends "chain%d.form" %%}'
+        '{%% block Block%d %%}{{ value }}{%% endblock %%}' % (depth - 1, depth)
+    )
+with open(DEFAULT_FORM) as source:
+    TEMPLATES['formulation/default.form'] = source.read()
+
+
+class SimpleForm(forms.Form):
+    name = forms.CharField()
+
+
+class RowForm(forms.Form):
+    name = forms.CharField()
+    email = forms.EmailField()
+    count = forms.IntegerField()
+
+
+class ContactForm(forms.Form):
+    name = forms.CharField(help_text='Your full name')
+    email = forms.EmailField()
+    age = forms.IntegerField(required=False)
+
+
+class BigSelectForm(forms.Form):
+    choice = forms.ChoiceField(
+        choices=[(i, 'Option %d' % i) for i in range(10000)],
+    )
+
+
+class NoBlockWidget(forms.Widget):
+    '''No class in its MRO has a block in bench.form.'''
+
+
+class NoBlockForm(forms.Form):
+    nothing = forms.CharField(widget=NoBlockWidget)
+
+
+def template(source):
+    return Template('{% load formulation %}' + source)
+
+
+def bench_field():
+    '''{% field %} of one CharField.'''
+    tmpl = template(
+        "{% form 'bench.form' %}{% field form.name %}{% endform %}"
+    )
+    context = Context({'form': SimpleForm(initial={'name': 'x'})})
+    return lambda: tmpl.render(context)
+
+
+def bench_field_django():
+    tmpl = template('{{ form.name }}')
+    context = Context({'form': SimpleForm(initial={'name': 'x'})})
+    return lambda: tmpl.render(context)
+
+
+def bench_default_form():
+    '''{% fields %} of a form of three inputs, with the default template.'''
+    tmpl = template(
+        "{% form 'formulation/default.form' %}{% fields form %}{% endform %}"
+    )
+    context = Context({'form': ContactForm(initial={'name': 'x'})})
+    return lambda: tmpl.render(context)
+
+
+def bench_default_form_django():
+    tmpl = template('{{ form }}')
+    context = Context({'form': ContactForm(initial={'name': 'x'})})
+    return lambda: tmpl.render(context)
+
+
+def dispatch_miss(cached):
+    context = Context()
+    index = get_block_index('bench.form', context)
+    field = NoBlockForm()['nothing']
+    with form_scope(context, index, None) as safe_context:
+        assert dispatch_widget(safe_context, field) is None, 'found a block'
+
+    def run():
+        if not cached:
+            _dispatch_cache.clear()
+        with form_scope(context, index, None) as safe_context:
+            dispatch_widget(safe_context, field)
+    return run
+
+
+def bench_dispatch_miss():
+    '''auto-widget search which finds no block.'''
+    return dispatch_miss(cached=False)
+
+
+def bench_dispatch_miss_cached():
+    '''auto-widget search which finds no block, a second time.'''
+    return dispatch_miss(cached=True)
+
+
+def bench_resolve_blocks():
+    '''Resolving the blocks of a deep {% extends %} chain.'''
+    name = 'chain%d.form' % EXTENDS_DEPTH
+    context = Context()
+    return lambda: resolve_blocks(name, context)
+
+
+def bench_block_index():
+    '''Looking up the indexed blocks of a deep {% extends %} chain.'''
+    name = 'chain%d.form' % EXTENDS_DEPTH
+    context = Context()
+    return lambda: get_block_index(name, context)
+
+
+def formset_context():
+    RowFormSet = forms.formsets.formset_factory(RowForm, extra=500)
+    return Context({'formset': RowFormSet()})
+
+
+def bench_formset():
+    '''{% formset %} of 500 rows, with the default template.'''
+    tmpl = template(
+        "{% formset 'formulation/default.form' formset %}{% endformset %}"
+    )
+    context = formset_context()
+    return lambda: tmpl.render(context)
+
+
+def bench_formset_django():
+    tmpl = template('{{ formset }}')
+    context = formset_context()
+    return lambda: tmpl.render(context)
+
+
+def bench_select():
+    '''A Select of 10000 options, with the default template.'''
+    tmpl = template(
+        "{% form 'formulation/default.form' %}{% field form.choice %}"
+        "{% endform %}"
+    )
+    context = Context({'form': BigSelectForm(initial={'choice': 5000})})
+    return lambda: tmpl.render(context)
+
+
+def bench_select_django():
+    tmpl = template('{{ form.choice }}')
+    context = Context({'form': BigSelectForm(initial={'choice': 5000})})
+    return lambda: tmpl.render(context)
+
+
+def bench_use():
+    '''Nested {% use %}.'''
+    tmpl = template(
+        "{% form 'nested.form' %}{% use 'use0' value=1 %}{% endform %}"
+    )
+    context = Context()
+    return lambda: tmpl.render(context)
+
+
+def bench_reuse():
+    '''Nested {% reuse %}.'''
+    tmpl = get_template('reuse.html')
+    context = Context({'value': 1})
+    return lambda: tmpl.render(context)
+
+
+BENCHMARKS = [
+    ('field', bench_field, bench_field_django),
+    ('default_form', bench_default_form, bench_default_form_django),
+    ('dispatch_miss', bench_dispatch_miss, None),
+    ('dispatch_miss_cached', bench_dispatch_miss_cached, None),
+    ('resolve_blocks', bench_resolve_blocks, None),
+    ('block_index', bench_block_index, None),
+    ('formset_500', bench_formset, bench_formset_django),
+    ('select_10000', bench_select, bench_select_django),
+    ('use_nested', bench_use, None),
+    ('reuse_nested', bench_reuse, None),
+]
+
+
+def measure(func, number, repeat):
+    '''Return (best seconds per call, allocation stats) for calling func.'''
+    func()  # Warm up any caches
+    gc.collect()
+    timer = timeit.Timer(func)
+    best = min(timer.repeat(repeat=repeat, number=number)) / number
+
+    memory = None
+    if tracemalloc is not None:
+        tracemalloc.start()
+        func()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        memory = {'current': current, 'peak': peak}
+    return best, memory
+
+
+def compare(results, baseline, threshold):
+    '''Yield (name, ratio) for benchmarks slower than baseline * threshold.'''
+    for name, result in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        ratio = result['time'] / old['time']
+        if ratio > threshold:
+            yield name, ratio
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().split('\n')[0])
+    parser.add_argument('names', nargs='*', help='benchmarks to run')
+    parser.add_argument('--number', type=int, default=0,
+                        help='calls per repeat (default: about 0.2s worth)')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', help='file to save the results in')
+    parser.add_argument('--compare', help='results file to compare with')
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help='slowdown allowed by --compare (default: 1.2)')
+    parser.add_argument('--compile', action='store_true',
+                        help='compile widget blocks (FORMULATION_COMPILE)')
+    args = parser.parse_args()
+
+    setup_templates(TEMPLATES)
+
+    results = {}
+    for name, bench, django_bench in BENCHMARKS:
+        if args.names and name not in args.names:
+            continue
+        func = bench()
+        number = args.number
+        if not number:
+            duration = timeit.Timer(func).timeit(number=1)
+            number = max(1, int(0.2 / max(duration, 1e-6)))
+        result = {'number': number}
+        result['time'], result['memory'] = measure(func, number, args.repeat)
+        line = '%-22s %10.1fus' % (name, result['time'] * 1e6)
+        if result['memory']:
+            line += ' %10d bytes peak' % result['memory']['peak']
+        if django_bench is not None:
+            result['django'], result['django_memory'] = measure(
+                django_bench(), number, args.repeat,
+            )
+            line += '   django %10.1fus (x%.2f)' % (
+                result['django'] * 1e6, result['time'] / result['django'],
+            )
+            if result['django_memory']:
+                line += ' %10d bytes peak' % result['django_memory']['peak']
+        print(line)
+        results[name] = result
+
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump({
+                'python': sys.version.split()[0],
+                'django': django.get_version(),
+                'compile': args.compile,
+                'results': results,
+            }, output, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as source:
+            baseline = json.load(source)['results']
+        slower = list(compare(results, baseline, args.threshold))
+        for name, ratio in slower:
+            print('%s is %.2f times slower than before' % (name, ratio))
+        if slower:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
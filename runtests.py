@@ -16,6 +16,12 @@ if django.VERSION < (1, 6):
 else:
     extra_settings = {}
 
+if django.VERSION >= (1, 8):
+    extra_settings['TEMPLATES'] = [{
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'APP_DIRS': True,
+    }]
+
 
 if not settings.configured:
     settings.configure(
@@ -1,16 +1,42 @@
+import sys
+
 from setuptools import setup
+from setuptools.command.build_py import build_py
+
+
+class BuildPy(build_py):
+    '''Leave out formulation.aio where its syntax doesn't compile.'''
+
+    def find_package_modules(self, package, package_dir):
+        modules = build_py.find_package_modules(self, package, package_dir)
+        if sys.version_info < (3, 6):
+            modules = [
+                module for module in modules
+                if module[:2] != ('formulation', 'aio')
+            ]
+        return modules
+
 
 setup(
     name='formulation',
-    version='2.0.13',
+    version='2.1.0',
     description='Django Form rendering tool',
     author='Curtis Maloney',
     author_email='curtis@tinbrain.net',
     keywords=['django', 'forms', 'templates'],
-    packages = ['formulation', 'formulation.templatetags'],
+    packages = [
+        'formulation',
+        'formulation.management',
+        'formulation.management.commands',
+        'formulation.templatetags',
+    ],
     package_data = {
-        'formulation': ['templates/formulation/*.form',],
+        'formulation': [
+            'templates/formulation/*.form',
+            'static/formulation/*.js',
+        ],
     },
+    cmdclass={'build_py': BuildPy},
     zip_safe=False,
     classifiers = [
         'Environment :: Web Environment',
@@ -23,6 +49,7 @@ setup(
         'Programming Language :: Python :: 3',
         'Programming Language :: Python :: 3.3',
         'Programming Language :: Python :: 3.4',
+        'Programming Language :: Python :: 3.6',
         'Programming Language :: Python :: Implementation :: PyPy',
     ],
 )
@@ -0,0 +1,8 @@
+from django.db import models
+
+
+class Colour(models.Model):
+    name = models.CharField(max_length=32)
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,107 @@
+from unittest import skipIf
+
+from django import forms
+from django.forms.models import modelformset_factory
+from django.test import TransactionTestCase
+
+import formulation
+from formulation.analysis import profile
+
+from ..models import Colour
+from ..utils import TemplatesMixin
+
+
+TEMPLATES = {
+    'aio.form': '''
+{% load formulation %}
+{% block Select %}<{{ html_name }}>{% options "option" %}{% endblock %}
+{% block SelectMultiple %}{% use "Select" %}{% endblock %}
+{% block option %}{{ display }}{% if selected %}*{% endif %},{% endblock %}
+{% block HiddenInput %}[{{ value }}]{{ errors }}{% endblock %}
+{% block TextInput %}{{ value }};{% endblock %}
+''',
+    'text.form': '{% block TextInput %}{{ html_name }};{% endblock %}',
+}
+
+
+class ColourForm(forms.Form):
+    colour = forms.ModelChoiceField(queryset=Colour.objects.all())
+    colours = forms.ModelMultipleChoiceField(queryset=Colour.objects.all())
+    hidden = forms.ModelChoiceField(
+        queryset=Colour.objects.all(), widget=forms.HiddenInput,
+    )
+
+
+class NameForm(forms.Form):
+    name = forms.CharField()
+
+
+def run(coroutine):
+    import asyncio
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+@skipIf(not hasattr(formulation, 'arender'), 'Needs Python 3.6')
+class AsyncRenderTest(TemplatesMixin, TransactionTestCase):
+    # Choices may be fetched in other threads, so can't be in a transaction
+
+    TEMPLATES = TEMPLATES
+
+    def test_prefetch(self):
+        red = Colour.objects.create(name='red')
+        blue = Colour.objects.create(name='blue')
+        form = ColourForm(initial={
+            'colour': blue.pk, 'colours': [red.pk], 'hidden': red.pk,
+        })
+        # Choices are fetched away from the event loop's thread
+        with self.assertNumQueries(0):
+            rendered = run(formulation.arender('aio.form', form))
+        self.assertEqual(
+            rendered,
+            '<colour>---------,red,blue*,<colours>red*,blue,[%d]' % red.pk,
+        )
+        self.assertEqual(
+            rendered, ''.join(formulation.render_iter('aio.form', form)),
+        )
+
+    def test_bound(self):
+        red = Colour.objects.create(name='red')
+        form = ColourForm(data={
+            'colour': red.pk, 'colours': [red.pk], 'hidden': red.pk,
+        })
+        # Cleaning the form queries for each value, away from the event loop
+        with self.assertNumQueries(0):
+            rendered = run(formulation.arender('aio.form', form))
+        self.assertEqual(form.errors, {})
+        self.assertEqual(
+            rendered, '<colour>---------,red*,<colours>red*,[%d]' % red.pk,
+        )
+
+    def test_model_formset(self):
+        red = Colour.objects.create(name='red')
+        formset = modelformset_factory(Colour, fields=['name'], extra=0)(
+            queryset=Colour.objects.all(),
+        )
+        # The formset's queryset is fetched away from the event loop too
+        with self.assertNumQueries(0):
+            rendered = run(formulation.arender('aio.form', formset))
+        self.assertEqual(rendered, '[1][1][0][1000]red;[%d]' % red.pk)
+
+    def test_management_form(self):
+        formset = forms.formsets.formset_factory(NameForm)()
+        rendered = run(formulation.arender('text.form', formset))
+        self.assertEqual(
+            rendered, str(formset.management_form) + 'form-0-name;',
+        )
+
+    def test_queryset_fields(self):
+        from formulation.aio import queryset_fields
+        form = ColourForm()
+        plans = [(form, [
+            ('colour', 'Select', None),
+            ('hidden', 'HiddenInput', profile('aio.form')['HiddenInput']),
+        ])]
+        self.assertEqual(
+            [field for key, field in queryset_fields(plans)],
+            [form.fields['colour']],
+        )
@@ -0,0 +1,90 @@
+from django import forms
+from django.template import Context, Template
+from django.test import TestCase
+
+from formulation.analysis import profile
+
+from ..models import Colour
+from ..utils import TemplatesMixin
+
+
+TEMPLATES = {
+    'analysis.form': '''
+{% load formulation %}
+{% block _label %}<label for="{{ id }}">{{ label }}</label>{% endblock %}
+{% block input %}{% use "_label" %}\
+{% with kind=field_type|default:"text" %}\
+<input type="{{ kind }}" value="{{ value }}">{% endwith %}{% endblock %}
+{% block TextInput %}\
+{% use "input" field_type="text" id=auto_id %}{% endblock %}
+{% block Select %}{% for val, label in choices %}\
+{% if val in selected %}{{ label }}{% endif %}{% endfor %}{% endblock %}
+{% block HiddenInput %}{{ value|default:"" }}{% endblock %}
+{% block dynamic %}{% use widget_name %}{% endblock %}
+{% block nested %}{% for row in rows %}{% for cell in row %}\
+{{ forloop.parentloop.counter }}{% endfor %}{% endfor %}{% endblock %}
+{% block outer %}{% for cell in row %}\
+{{ forloop.parentloop.counter }}{% endfor %}{% endblock %}
+{% block changed %}{% use "_label" %}\
+{% ifchanged errors %}{{ help_text }}{% endifchanged %}{% endblock %}
+''',
+}
+
+
+class ColourForm(forms.Form):
+    colour = forms.ModelChoiceField(
+        queryset=Colour.objects.all(), widget=forms.HiddenInput,
+    )
+
+
+class AnalysisTest(TemplatesMixin, TestCase):
+    TEMPLATES = TEMPLATES
+
+    def test_use(self):
+        info = profile('analysis.form')['TextInput']
+        self.assertTrue(info.complete)
+        self.assertEqual(info.uses, set(['input', '_label']))
+        # field_type and id are passed in, and {% with %} binds kind
+        self.assertEqual(info.references, set(['auto_id', 'label', 'value']))
+        self.assertEqual(info.field_data, set(['label', 'value']))
+
+    def test_loop(self):
+        info = profile('analysis.form')['Select']
+        self.assertEqual(info.references, set(['choices', 'selected']))
+        self.assertFalse(info.reads('value'))
+
+    def test_incomplete(self):
+        info = profile('analysis.form')['dynamic']
+        self.assertFalse(info.complete)
+        self.assertTrue(info.reads('anything'))
+
+    def test_parentloop(self):
+        # Within the block's own loops, parentloop is one of them
+        info = profile('analysis.form')['nested']
+        self.assertEqual(info.references, set(['rows']))
+        self.assertTrue(info.cacheable)
+        # but otherwise the loop around the block
+        info = profile('analysis.form')['outer']
+        self.assertEqual(info.references, set(['forloop', 'row']))
+        self.assertTrue(info.complete)
+        self.assertFalse(info.static)
+
+    def test_stateful(self):
+        info = profile('analysis.form')['changed']
+        self.assertTrue(info.complete)
+        self.assertFalse(info.cacheable)
+        self.assertFalse(info.static)
+        self.assertEqual(
+            info.references, set(['errors', 'help_text', 'id', 'label']),
+        )
+        self.assertTrue(profile('analysis.form')['_label'].cacheable)
+
+    def test_value_without_choices(self):
+        Colour.objects.create(name='red')
+        template = Template(
+            "{% load formulation %}{% form 'analysis.form' %}"
+            "{% field form.colour %}{% endform %}"
+        )
+        context = Context({'form': ColourForm(initial={'colour': 3})})
+        with self.assertNumQueries(0):
+            self.assertEqual(template.render(context), '3')
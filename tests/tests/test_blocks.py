@@ -0,0 +1,60 @@
+import os
+import shutil
+import tempfile
+
+from django.template import Context, Template
+from django.test import SimpleTestCase
+
+from formulation.blocks import get_block_index
+from formulation.utils import clear_caches
+
+from ..utils import template_dirs
+
+
+class BlockIndexTest(SimpleTestCase):
+    """
+    Test the persistent index of widget template blocks.
+    """
+    def setUp(self):
+        self.template_dir = tempfile.mkdtemp()
+        clear_caches()
+
+    @property
+    def template(self):
+        # On Django 1.8+, a Template keeps the engine of the current settings
+        return Template(
+            "{% load formulation %}{% form 'index.form' %}{% use 'A' %}"
+            "{% endform %}"
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.template_dir)
+        clear_caches()
+
+    def write(self, name, content, mtime=None):
+        path = os.path.join(self.template_dir, name)
+        with open(path, 'w') as fh:
+            fh.write(content)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+
+    def test_index_reused(self):
+        self.write('base.form', '{% block A %}base{% endblock %}')
+        self.write('index.form', '''{% extends "base.form" %}'''
+                   '''{% block A %}{{ block.super }} child{% endblock %}''')
+        with template_dirs([self.template_dir]):
+            index = get_block_index('index.form', Context())
+            self.assertIs(get_block_index('index.form', Context()), index)
+            self.assertEqual(self.template.render(Context()), 'base child')
+            # Each render gets its own copy of the block stacks
+            self.assertEqual(self.template.render(Context()), 'base child')
+            self.assertEqual(index.chains['A'][0].nodelist.render(Context()),
+                             'base')
+
+    def test_stale_in_debug(self):
+        self.write('base.form', '{% block A %}one{% endblock %}', 1000000)
+        self.write('index.form', '{% extends "base.form" %}')
+        with template_dirs([self.template_dir], debug=True):
+            self.assertEqual(self.template.render(Context()), 'one')
+            self.write('base.form', '{% block A %}two{% endblock %}', 2000000)
+            self.assertEqual(self.template.render(Context()), 'two')
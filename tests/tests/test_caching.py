@@ -0,0 +1,141 @@
+from django import forms
+from django.core.cache import cache
+from django.template import Context, Template
+from django.test import SimpleTestCase
+
+from formulation.blocks import get_block_index
+
+from ..utils import TemplatesMixin
+
+
+TEMPLATES = {
+    'cache.form': '''
+{% load formulation %}
+{% block TextInput %}\
+<input name="{{ html_name }}" value="{{ value|default:"" }}">\
+{{ errors|join:"," }}{% endblock %}
+{% block Select %}{{ label }}:\
+{% for val, display in choices %}{{ display }},{% endfor %}{% endblock %}
+''',
+    'equal.form':
+        '{% block TextInput %}{% if a == b %}={% endif %}{% endblock %}',
+    'unequal.form':
+        '{% block TextInput %}{% if a != b %}={% endif %}{% endblock %}',
+}
+
+
+class NameForm(forms.Form):
+    name = forms.CharField(max_length=5)
+
+
+class PickForm(forms.Form):
+    pick = forms.ChoiceField()
+
+    def __init__(self, label, choices, **kwargs):
+        super(PickForm, self).__init__(**kwargs)
+        self.fields['pick'].label = label
+        self.fields['pick'].choices = choices
+
+
+class FragmentCacheTest(TemplatesMixin, SimpleTestCase):
+    TEMPLATES = TEMPLATES
+
+    def setUp(self):
+        cache.clear()
+
+    def render(self, body, **context):
+        template = Template(
+            "{% load formulation %}"
+            "{% form 'cache.form' form cache=60 " + body + "{% endform %}"
+        )
+        return template.render(Context(context))
+
+    def test_unbound(self):
+        body = "%}{% field form.name %}{{ other }}"
+        self.assertEqual(
+            self.render(body, form=NameForm(), other='one'),
+            '<input name="name" value="">one',
+        )
+        # other isn't part of the key, so the cached result is used
+        self.assertEqual(
+            self.render(body, form=NameForm(), other='two'),
+            '<input name="name" value="">one',
+        )
+        # but the form's state is
+        self.assertEqual(
+            self.render(body, form=NameForm(initial={'name': 'x'}), other='3'),
+            '<input name="name" value="x">3',
+        )
+
+    def test_bound(self):
+        body = "%}{% field form.name %}"
+        self.assertEqual(
+            self.render(body, form=NameForm(data={'name': 'abc'})),
+            '<input name="name" value="abc">',
+        )
+        self.assertEqual(
+            self.render(body, form=NameForm(data={'name': 'abcdefg'})),
+            '<input name="name" value="abcdefg">'
+            'Ensure this value has at most 5 characters (it has 7).',
+        )
+
+    def test_field_setup(self):
+        body = "%}{% field form.pick %}"
+        self.assertEqual(
+            self.render(body, form=PickForm('Mine', [('a', 'A')])), 'Mine:A,',
+        )
+        self.assertEqual(
+            self.render(body, form=PickForm('Yours', [('b', 'B')])),
+            'Yours:B,',
+        )
+        # Set up which can't be hashed isn't keyed, so isn't cached
+        body = "%}{% field form.pick %}{{ other }}"
+        form = PickForm('Mine', [('a', 'A')])
+        form.fields['pick'].widget.attrs['data-tags'] = set(['x'])
+        self.assertEqual(self.render(body, form=form, other=1), 'Mine:A,1')
+        self.assertEqual(self.render(body, form=form, other=2), 'Mine:A,2')
+
+    def test_vary(self):
+        body = "vary=other %}{{ other }}"
+        self.assertEqual(self.render(body, form=None, other='one'), 'one')
+        self.assertEqual(self.render(body, form=None, other='two'), 'two')
+
+    def test_holes(self):
+        body = "%}{% csrf_token %}"
+        for token in ('first', 'second'):
+            self.assertEqual(
+                self.render(body, form=NameForm(), csrf_token=token),
+                "<input type='hidden' name='csrfmiddlewaretoken' "
+                "value='%s' />" % token,
+            )
+
+    def test_source_changes(self):
+        # Each infix operator's node has the same class name and attributes
+        body = "%}{% if a == b %}={% else %}!{% endif %}"
+        self.assertEqual(self.render(body, form=None, a=1, b=1), '=')
+        body = "%}{% if a != b %}={% else %}!{% endif %}"
+        self.assertEqual(self.render(body, form=None, a=1, b=1), '!')
+
+    def test_fingerprints(self):
+        def fingerprint(body):
+            template = Template(
+                "{% load formulation %}{% form 'cache.form' form %}" + body +
+                "{% endform %}"
+            )
+            return template.nodelist[-1].fingerprint()
+
+        self.assertNotEqual(
+            fingerprint("{% if a == b %}{% endif %}"),
+            fingerprint("{% if a != b %}{% endif %}"),
+        )
+        # Both are SimpleNodes on Django < 1.9
+        self.assertNotEqual(
+            fingerprint("{% fields form %}"),
+            fingerprint("{% options form %}"),
+        )
+
+        context = Context()
+        self.assertNotEqual(
+            get_block_index('equal.form', context).fingerprint(),
+            get_block_index('unequal.form', context).fingerprint(),
+        )
@@ -0,0 +1,96 @@
+from django import forms
+from django.template import Context, Template
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+
+from formulation import compiler
+from formulation.blocks import get_block_index
+from formulation.compiler import compile_block
+
+from ..utils import TemplatesMixin
+
+
+TEMPLATES = {
+    'compiled.form': '''{% load formulation %}
+{% block _label %}\
+{% if label %}<label for="{{ id }}">{{ label }}</label>{% endif %}\
+{% endblock %}
+{% block TextInput %}{% use "_label" %}
+{% with kind=field_type|default:"text" %}\
+<input type="{{ kind }}" name="{{ html_name }}" \
+value="{{ value|default:"" }}" class="{{ errors|yesno:"error," }}"\
+{{ widget.attrs|flat_attrs }}>{% endwith %}
+{% for error in errors %}<em>{{ error }}</em>{% endfor %}{% endblock %}
+{% block EmailInput %}{% use "TextInput" field_type="email" %}{% endblock %}
+{% block Textarea %}<textarea>{{ value|default:""|upper }}</textarea>\
+{% if missing.thing or value == "x" %}!{% elif value %}?{% else %}-{% endif %}\
+{% endblock %}
+''',
+    'super.form': '''{% extends "compiled.form" %}
+{% block _label %}[{{ block.super }}]{% endblock %}
+''',
+    'self.form': '''{% extends "compiled.form" %}{% load formulation %}
+{% block _label %}<{% use "_label" %}>{% endblock %}
+''',
+}
+
+
+class SignupForm(forms.Form):
+    name = forms.CharField(widget=forms.TextInput(attrs={'size': 5}))
+    email = forms.EmailField()
+    notes = forms.CharField(widget=forms.Textarea, required=False)
+
+
+class CompilerTest(TemplatesMixin, SimpleTestCase):
+    TEMPLATES = TEMPLATES
+
+    def render(self, tmpl_name, form):
+        tmpl = Template(
+            '{% load formulation %}{% form tmpl_name %}'
+            '{% field form.name %}|{% field form.email %}|'
+            '{% field form.notes %}'
+            '{% endform %}'
+        )
+        return tmpl.render(Context({'form': form, 'tmpl_name': tmpl_name}))
+
+    def assertSameOutput(self, tmpl_name, form):
+        self.assertFalse(compiler.enabled)
+        expected = self.render(tmpl_name, form)
+        with override_settings(FORMULATION_COMPILE=True):
+            self.assertTrue(compiler.enabled)
+            self.assertEqual(self.render(tmpl_name, form), expected)
+            # Again, with the compiled functions
+            self.assertEqual(self.render(tmpl_name, form), expected)
+        return expected
+
+    def test_unbound(self):
+        output = self.assertSameOutput(
+            'compiled.form', SignupForm(initial={'name': '<b>'}),
+        )
+        self.assertIn('value="&lt;b&gt;"', output)
+
+    def test_bound(self):
+        output = self.assertSameOutput('compiled.form', SignupForm({
+            'name': 'x', 'email': 'bad', 'notes': 'x',
+        }))
+        self.assertIn('<em>', output)
+        self.assertIn('type="email"', output)
+
+    def test_block_super(self):
+        output = self.assertSameOutput('super.form', SignupForm())
+        self.assertIn('[<label for="id_name">', output)
+
+    def test_use_own_name(self):
+        # Renders the parent block, which BlockNode.render leaves on top
+        output = self.assertSameOutput('self.form', SignupForm())
+        self.assertIn('<<label for="id_name">Name</label>>', output)
+
+    def test_compiled_blocks(self):
+        index = get_block_index('super.form', Context())
+        chains = index.chains
+        # Reads block.super, so is left to BlockNode
+        self.assertIsNone(compile_block(chains['_label'][-1]))
+        self.assertIsNotNone(compile_block(chains['_label'][0]))
+        self.assertIsNotNone(compile_block(chains['TextInput'][-1]))
+        # string_if_invalid can't be followed
+        self.assertIsNone(compile_block(chains['Textarea'][-1], 'INVALID'))
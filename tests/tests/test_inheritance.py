@@ -1,7 +1,8 @@
 from django.template import Context
-from django.template.loader import get_template
 from django.test import SimpleTestCase
-from django.test.utils import setup_test_template_loader, restore_template_loaders
+
+
+from ..utils import TemplatesMixin, get_template
 
 
 TEMPLATES = {
@@ -21,19 +22,19 @@ TEMPLATES = {
     {% endform %}
 {% endblock %}
 {% block two %}<div>overridden</div>{% endblock %}
+''',
+    'base.form': '{% block TextInput %}base{% endblock %}',
+    'one.form': '{% extends "base.form" %}{% block _x %}1{% endblock %}',
+    'two.form': '{% extends "base.form" %}{% block _x %}2{% endblock %}',
+    'siblings.html': '''{% load formulation %}
+{% form 'one.form' %}{% use "_x" %}{% use "TextInput" %}{% endform %}
+{% form 'two.form' %}{% use "_x" %}{% use "TextInput" %}{% endform %}
 ''',
 }
 
 
-class InheritanceTests(SimpleTestCase):
-
-    @classmethod
-    def setUpClass(cls):
-        setup_test_template_loader(TEMPLATES)
-
-    @classmethod
-    def tearDownClass(cls):
-        restore_template_loaders()
+class InheritanceTests(TemplatesMixin, SimpleTestCase):
+    TEMPLATES = TEMPLATES
 
     def test_inheritance(self):
         """
@@ -44,3 +45,8 @@ class InheritanceTests(SimpleTestCase):
         tpl = get_template('inherited.html')
         render = tpl.render(Context())
         self.assertInHTML('<div>overridden</div>', render)
+
+    def test_shared_parent(self):
+        # Finding the parent of one.form mustn't stop two.form finding it
+        render = get_template('siblings.html').render(Context())
+        self.assertEqual(render.split(), ['1base', '2base'])
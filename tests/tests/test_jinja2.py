@@ -0,0 +1,122 @@
+from unittest import skipIf
+
+from django import forms
+from django.test import SimpleTestCase
+
+from formulation.utils import clear_caches
+
+try:
+    import jinja2
+except ImportError:
+    jinja2 = None
+else:
+    from jinja2.exceptions import TemplateRuntimeError
+
+
+TEMPLATES = {
+    'base.jinja': '''
+{% block TextInput %}\
+<input name="{{ html_name }}" value="{{ value or '' }}">{% endblock %}
+{% block _label %}\
+<label for="{{ id }}">{{ label }}{{ suffix }}</label>{% endblock %}
+{% block HiddenInput %}({{ html_name }}){% endblock %}
+''',
+    'child.jinja': '''{% extends "base.jinja" %}
+{% block TextInput %}[{{ super() }}]{% endblock %}
+{% block email %}{% use "_label" suffix=":" %}{{ value }}{% endblock %}
+{% block Select %}{% for val, display in choices %}\
+{{ val }}{% if val in selected %}*{% endif %}{% endfor %}{% endblock %}
+''',
+}
+
+
+class ContactForm(forms.Form):
+    name = forms.CharField()
+    email = forms.EmailField()
+    number = forms.IntegerField()
+    colour = forms.ChoiceField(choices=[(1, 'Red'), (2, 'Blue')])
+
+
+@skipIf(jinja2 is None, 'Jinja2 is not installed')
+class JinjaExtensionTest(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        clear_caches()
+        cls.env = jinja2.Environment(
+            loader=jinja2.DictLoader(TEMPLATES),
+            extensions=['formulation.jinja2.FormulationExtension'],
+            autoescape=True,
+        )
+
+    def render(self, source, **context):
+        return self.env.from_string(source).render(**context)
+
+    def test_field(self):
+        output = self.render(
+            '{% form "base.jinja" %}{% field form.name %}{% endform %}',
+            form=ContactForm(initial={'name': '<Jo>'}),
+        )
+        self.assertEqual(output, '<input name="name" value="&lt;Jo&gt;">')
+
+    def test_super(self):
+        output = self.render(
+            '{% form "child.jinja" form %}{% field "name" %}{% endform %}',
+            form=ContactForm(),
+        )
+        self.assertEqual(output, '[<input name="name" value="">]')
+
+    def test_auto_widget_order(self):
+        # The block for the field name is preferred to the widget's, and
+        # NumberInput falls back to its ancestor TextInput
+        output = self.render(
+            '{% form "child.jinja" form %}'
+            '{% field form.email %}|{% field form.number %}{% endform %}',
+            form=ContactForm(initial={'email': 'a@b.c', 'number': 3}),
+        )
+        self.assertEqual(
+            output,
+            '<label for="id_email">Email:</label>a@b.c|'
+            '[<input name="number" value="3">]',
+        )
+
+    def test_choices(self):
+        output = self.render(
+            '{% form "child.jinja" form %}'
+            '{% field form.colour %}{% endform %}',
+            form=ContactForm(initial={'colour': 2}),
+        )
+        self.assertEqual(output, '12*')
+
+    def test_widget_and_values(self):
+        output = self.render(
+            '{% form "base.jinja" form %}'
+            '{% field form.name "HiddenInput" html_name="other" %}'
+            '{% use "_label" id="x" label=title %}{% endform %}',
+            form=ContactForm(), title='Title',
+        )
+        self.assertEqual(output, '(other)<label for="x">Title</label>')
+
+    def test_missing_block(self):
+        with self.assertRaises(TemplateRuntimeError):
+            self.render(
+                '{% form "base.jinja" form %}{% field form.colour %}'
+                '{% endform %}',
+                form=ContactForm(),
+            )
+
+    def test_outside_form(self):
+        with self.assertRaises(TemplateRuntimeError):
+            self.render('{% use "_label" %}')
+
+    def test_reuse(self):
+        output = self.render(
+            '{% if false %}{% block item %}<{{ n }}>{% endblock %}{% endif %}'
+            '{% reuse "item" n=1 %}{% reuse ["missing", "item"] n=2 %}'
+            '{% reuse "missing" %}',
+        )
+        self.assertEqual(output, '<1><2>')
+
+    def test_flat_attrs(self):
+        output = self.render('{{ {"class": "a"}|flat_attrs }}')
+        self.assertEqual(output, ' class="a"')
@@ -0,0 +1,108 @@
+import logging
+
+from django import forms
+from django.template import Context, Template
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+
+from formulation import profiling
+from formulation.utils import clear_caches
+
+from ..utils import TemplatesMixin
+
+
+TEMPLATES = {
+    'profile.form': '''
+{% load formulation %}
+{% block _label %}{{ label }}{% endblock %}
+{% block TextInput %}{% use "_label" %}\
+<input name="{{ html_name }}">{% endblock %}
+{% block Select %}{% for val, display in choices %}\
+{{ display }}{% endfor %}{% endblock %}
+''',
+}
+
+
+class PetForm(forms.Form):
+    name = forms.CharField()
+    kind = forms.ChoiceField(choices=[('c', 'Cat'), ('d', 'Dog')])
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class ProfilingTest(TemplatesMixin, SimpleTestCase):
+    TEMPLATES = TEMPLATES
+
+    def setUp(self):
+        # Blocks which only read static field data are rendered once
+        clear_caches()
+
+    def render(self):
+        template = Template(
+            "{% load formulation %}{% form 'profile.form' %}"
+            "{% field form.name %}{% field form.kind %}{% endform %}"
+        )
+        return template.render(Context({'form': PetForm()}))
+
+    def test_disabled(self):
+        self.assertFalse(profiling.enabled)
+
+    def test_collect(self):
+        with profiling.collect() as collector:
+            self.assertTrue(profiling.enabled)
+            output = self.render()
+        self.assertFalse(profiling.enabled)
+
+        label, name, kind = collector.records
+        self.assertEqual(
+            (label.kind, label.name, label.size), ('block', '_label', 4),
+        )
+        self.assertEqual(
+            (name.kind, name.name, name.block, name.candidates, name.choices),
+            ('field', 'name', 'TextInput', 6, None),
+        )
+        self.assertEqual((kind.block, kind.choices), ('Select', 2))
+
+        profile, = collector.forms
+        self.assertEqual(profile.template, 'profile.form')
+        self.assertEqual(profile.size, len(output))
+        self.assertEqual(len(profile.records), 3)
+        self.assertGreaterEqual(profile.duration, name.duration)
+
+    def test_signal(self):
+        profiles = []
+
+        def receiver(sender, profile, **kwargs):
+            profiles.append(profile)
+
+        profiling.form_rendered.connect(receiver)
+        try:
+            with override_settings(FORMULATION_PROFILE=True):
+                self.render()
+        finally:
+            profiling.form_rendered.disconnect(receiver)
+        self.assertEqual(len(profiles), 1)
+        self.assertEqual(
+            [record.name for record in profiles[0].records],
+            ['_label', 'name', 'kind'],
+        )
+
+    def test_budget(self):
+        handler = ListHandler()
+        logger = logging.getLogger('formulation.profiling')
+        logger.addHandler(handler)
+        try:
+            with override_settings(FORMULATION_PROFILE_BUDGET=0):
+                self.render()
+        finally:
+            logger.removeHandler(handler)
+        message, = handler.messages
+        self.assertIn('over the budget of 0ms', message)
+        self.assertIn('name (TextInput)', message)
@@ -0,0 +1,80 @@
+from django import forms
+from django.http import StreamingHttpResponse
+from django.test import SimpleTestCase
+
+import formulation
+
+from ..utils import TemplatesMixin
+
+
+TEMPLATES = {
+    'render.form': '''
+{% block TextInput %}\
+[{{ html_name }}={{ value|default:"" }}{{ extra }}]{% endblock %}
+{% block HiddenInput %}({{ html_name }}){% endblock %}
+''',
+    'text.form': '{% block TextInput %}[{{ html_name }}]{% endblock %}',
+}
+
+
+class PersonForm(forms.Form):
+    first = forms.CharField()
+    last = forms.CharField()
+
+
+class RenderIterTest(TemplatesMixin, SimpleTestCase):
+    TEMPLATES = TEMPLATES
+
+    def test_form(self):
+        chunks = formulation.render_iter(
+            'render.form', PersonForm(initial={'first': 'Jo'}), extra='!',
+        )
+        self.assertEqual(list(chunks), ['[first=Jo!]', '[last=!]'])
+
+    def test_formset(self):
+        PersonFormSet = forms.formsets.formset_factory(PersonForm, extra=2)
+        chunks = list(formulation.render_iter('render.form', PersonFormSet()))
+        self.assertEqual(chunks[:4], [
+            '(form-TOTAL_FORMS)', '(form-INITIAL_FORMS)',
+            '(form-MIN_NUM_FORMS)', '(form-MAX_NUM_FORMS)',
+        ])
+        self.assertEqual(chunks[4:], [
+            '[form-0-first=]', '[form-0-last=]',
+            '[form-1-first=]', '[form-1-last=]',
+        ])
+
+    def test_management_form(self):
+        # Without a block for hidden inputs, Django renders the management form
+        formset = forms.formsets.formset_factory(PersonForm)()
+        chunks = list(formulation.render_iter('text.form', formset))
+        self.assertEqual(chunks, [
+            str(formset.management_form), '[form-0-first]', '[form-0-last]',
+        ])
+
+    def test_streaming_response(self):
+        response = StreamingHttpResponse(
+            formulation.render_iter('render.form', PersonForm(), {'extra': 1})
+        )
+        self.assertEqual(
+            b''.join(response.streaming_content), b'[first=1][last=1]'
+        )
+
+
+class RenderFieldTest(TemplatesMixin, SimpleTestCase):
+    TEMPLATES = TEMPLATES
+
+    def test_field(self):
+        form = PersonForm(initial={'first': 'Jo', 'last': 'Lo'})
+        self.assertEqual(
+            formulation.render_field('render.form', form, 'last'), '[last=Lo]',
+        )
+
+    def test_values(self):
+        output = formulation.render_field(
+            'render.form', PersonForm(), 'first', {'extra': '?'}, value='X',
+        )
+        self.assertEqual(output, '[first=X?]')
+
+    def test_unknown_field(self):
+        with self.assertRaises(KeyError):
+            formulation.render_field('render.form', PersonForm(), 'middle')
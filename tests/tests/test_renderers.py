@@ -0,0 +1,114 @@
+import datetime
+from unittest import skipIf
+
+from django import forms
+from django.test import SimpleTestCase
+
+from formulation.utils import clear_caches
+
+try:
+    from formulation.renderers import FormulationRenderer
+except ImportError:  # Django < 1.11
+    FormulationRenderer = None
+
+
+class PetForm(forms.Form):
+    name = forms.CharField()
+    kind = forms.ChoiceField(choices=[
+        ('c', 'Cat'), ('Other', [('d', 'Dog'), ('f', 'Fish')]),
+    ])
+
+
+class DiaryForm(forms.Form):
+    day = forms.DateField(initial=datetime.date(2017, 4, 1))
+    at = forms.DateTimeField(initial=datetime.datetime(2017, 4, 1, 12, 30))
+    time = forms.TimeField(initial=datetime.time(12, 30))
+    done = forms.BooleanField(initial=True)
+    mood = forms.ChoiceField(
+        widget=forms.RadioSelect, initial='b',
+        choices=[('g', 'Good'), ('b', 'Bad')],
+    )
+
+
+@skipIf(FormulationRenderer is None, 'Needs Django 1.11')
+class RendererTest(SimpleTestCase):
+
+    def setUp(self):
+        clear_caches()
+        self.renderer = FormulationRenderer()
+
+    def render(self, widget, name, value, attrs=None):
+        return ' '.join(
+            widget.render(name, value, attrs, renderer=self.renderer).split()
+        )
+
+    def test_widget(self):
+        self.assertEqual(
+            self.render(forms.TextInput(attrs={'size': 3}), 'name', 'x', {
+                'id': 'id_name',
+            }),
+            '<input type="text" name="name" id="id_name" value="x" '
+            'class=" " size="3" >',
+        )
+
+    def test_choices(self):
+        widget = PetForm.base_fields['kind'].widget
+        self.assertEqual(
+            self.render(widget, 'kind', 'd', {'id': 'id_kind'}),
+            '<select name="kind" id="id_kind" > '
+            '<option value="c" >Cat</option> '
+            '<option value="d" selected>Dog</option> '
+            '<option value="f" >Fish</option> </select>',
+        )
+
+    def test_fallback(self):
+        # There's no block for SelectDateWidget, so Django renders it
+        widget = forms.SelectDateWidget(years=[2000])
+        self.assertIn(
+            '<option value="2000">2000</option>',
+            self.render(widget, 'born', None),
+        )
+
+    def test_form(self):
+        form = PetForm(renderer=self.renderer, initial={'name': 'Rex'})
+        self.assertIn(
+            '<input type="text" name="name" id="id_name" value="Rex"',
+            ' '.join(str(form).split()),
+        )
+
+    def field(self, form, name):
+        return ' '.join(str(form[name]).split())
+
+    def test_initial_dates(self):
+        # Django formats the values for the widget already
+        form = DiaryForm(renderer=self.renderer)
+        self.assertIn('value="2017-04-01"', self.field(form, 'day'))
+        self.assertIn('value="2017-04-01 12:30:00"', self.field(form, 'at'))
+        self.assertIn('value="12:30:00"', self.field(form, 'time'))
+
+    def test_bound_dates(self):
+        form = DiaryForm(renderer=self.renderer, data={
+            'day': '1/4/2017', 'at': '2017-04-01 12:30', 'time': '12:30',
+        })
+        self.assertIn('value="1/4/2017"', self.field(form, 'day'))
+        self.assertIn('value="2017-04-01 12:30"', self.field(form, 'at'))
+        self.assertIn('value="12:30"', self.field(form, 'time'))
+
+    def test_checkbox(self):
+        self.assertEqual(
+            self.field(DiaryForm(renderer=self.renderer), 'done'),
+            '<label for="id_done" class=""> <input name="done" id="id_done" '
+            'type="checkbox" checked > </label>',
+        )
+        form = DiaryForm(renderer=self.renderer, initial={'done': False})
+        self.assertNotIn('checked', self.field(form, 'done'))
+
+    def test_radio(self):
+        self.assertEqual(
+            self.field(DiaryForm(renderer=self.renderer), 'mood'),
+            '<ul id="id_mood"> '
+            '<li><input type="radio" name="mood" id="id_mood_0" value="g" >'
+            'Good</li> '
+            '<li><input type="radio" name="mood" id="id_mood_1" value="b" '
+            'checked>Bad</li> </ul>',
+        )
@@ -0,0 +1,65 @@
+from unittest import skipIf
+
+import django
+from django.template import Context, Template
+from django.test import SimpleTestCase
+
+from formulation.templatetags.reuse import ReuseNode
+
+from ..utils import TemplatesMixin, get_template
+
+
+TEMPLATES = {
+    'base.html': '''{% load reuse %}
+{% block item %}<{{ n }}>{% endblock %}|{% block content %}{% endblock %}''',
+    'child.html': '''{% extends "base.html" %}{% load reuse %}
+{% block item %}({{ n }}){% endblock %}
+{% block content %}{% reuse "item" n=1 %}\
+{% reuse names n=2 %}{% endblock %}''',
+}
+
+
+class ReuseTagTest(TemplatesMixin, SimpleTestCase):
+    TEMPLATES = TEMPLATES
+
+    def test_extends(self):
+        template = get_template('child.html')
+        output = template.render(Context({'names': ['missing', 'item']}))
+        self.assertEqual(output.strip(), '()|(1)(2)')
+
+    @skipIf(django.VERSION < (1, 8), 'Needs the template in the context')
+    def test_registry(self):
+        template = get_template('child.html')
+        node = template.nodelist.get_nodes_by_type(ReuseNode)[0]
+        template.render(Context({'names': ['item']}))
+        registry = node.registry
+        # The block of the child template, which overrides its parent's
+        block = registry[1]['item']
+        self.assertEqual(block.nodelist.render(Context({'n': 0})), '(0)')
+        template.render(Context({'names': ['item']}))
+        self.assertIs(node.registry, registry)
+
+    @skipIf(django.VERSION < (1, 8), 'Needs the template in the context')
+    def test_without_extends(self):
+        template = Template(
+            '{% if False %}{% block row %}[{{ n }}]'
+            '{% endblock %}{% endif %}{% load reuse %}'
+            '{% for n in rows %}{% reuse "row" n=n %}{% endfor %}'
+            '{% reuse names %}'
+        )
+        output = template.render(Context({
+            'rows': [1, 2], 'names': ['missing', 'row'], 'n': 3,
+        }))
+        self.assertEqual(output, '[1][2][3]')
+
+    def test_missing(self):
+        template = Template('{% load reuse %}{% reuse "missing" n=1 %}')
+        self.assertEqual(template.render(Context()), '')
+
+    @skipIf(django.VERSION < (1, 8), 'Needs the template in the context')
+    def test_later_block(self):
+        template = Template(
+            '{% load reuse %}{% reuse "later" %}'
+            '{% if False %}{% block later %}!{% endblock %}{% endif %}'
+        )
+        self.assertEqual(template.render(Context()), '!')
@@ -1,8 +1,16 @@
 from django import forms
 from django.template import Context, Template, TemplateSyntaxError
-from django.template.loader import get_template
-from django.test import SimpleTestCase
-from django.test.utils import setup_test_template_loader, restore_template_loaders
+from django.test import SimpleTestCase, TestCase
+from django.utils.safestring import mark_safe
+
+from formulation.fields import shared_choices
+from formulation.templatetags.formulation import (
+    _option_cache, _static_cache, auto_widget,
+)
+from formulation.utils import clear_caches
+
+from ..models import Colour
+from ..utils import TemplatesMixin, get_template
 
 
 class TestForm(forms.Form):
@@ -37,7 +45,7 @@ class SelectForm(forms.Form):
     gender = forms.MultipleChoiceField(choices=(('male', 'male'), ('female', 'female')))
 
 
-class TemplateTestMixin(object):
+class TemplateTestMixin(TemplatesMixin):
     TEMPLATE_BASE = '''{{% load formulation %}}{{% form 'test.form' %}}{}{{% endform %}}'''
     TEMPLATES = {}
     PARTIALS = {}
@@ -47,11 +55,7 @@ class TemplateTestMixin(object):
         cls.context = Context({'form': TestForm()})
         for key, tmpl in cls.PARTIALS.items():
             cls.TEMPLATES[key] = cls.TEMPLATE_BASE.format(tmpl)
-        setup_test_template_loader(cls.TEMPLATES)
-
-    @classmethod
-    def tearDownClass(cls):
-        restore_template_loaders()
+        super(TemplateTestMixin, cls).setUpClass()
 
 STOCK_TEMPLATE = '''{{% load formulation %}}{{% form 'test.form' %}}{}{{% endform %}}'''
 
@@ -130,6 +134,20 @@ Tests for proper selected value detection.
         with self.assertRaises(TemplateSyntaxError):
             template.render(self.context)
 
+    def test_error_restores_context(self):
+        """
+        The context is left as it was, even when rendering fails.
+        """
+        template = get_template('unknown_block')
+        context = Context({'form': TestForm()})
+        depth = len(context.dicts)
+        render_depth = len(context.render_context.dicts)
+        with self.assertRaises(TemplateSyntaxError):
+            template.render(context)
+        self.assertEqual(len(context.dicts), depth)
+        self.assertEqual(len(context.render_context.dicts), render_depth)
+        self.assertNotIn('formulation', context)
+
     def test_auto_widget(self):
         """
         Choose the correct widget according to the form field.
@@ -236,11 +254,13 @@ class UseTagTest(TemplateTestMixin, SimpleTestCase):
         'test.form': '''
 {% block use_test %}{{ test }}{% endblock %}
 {% block use_test_context %}{{ test }}{% endblock %}
+{% block use_test_values %}{{ a }} {{ b }} {{ c }} {{ d }}{% endblock %}
         ''',
     }
     PARTIALS = {
         'use_tag': "{% use 'use_test' test='use tag test' %}",
         'use_tag_inherits_context': "{% use 'use_test_context' %}",
+        'use_tag_values': "{% use name a=1 b='two' c=test d=test|upper %}",
     }
 
     def test_use_tag(self):
@@ -260,6 +280,17 @@ class UseTagTest(TemplateTestMixin, SimpleTestCase):
         context = Context({'test': 'use tag test'})
         self.assertEqual(template.render(context), 'use tag test')
 
+    def test_use_tag_values(self):
+        template = get_template('use_tag_values')
+        context = Context({'test': 'x', 'name': 'use_test_values'})
+        self.assertEqual(template.render(context), '1 two x X')
+
+    def test_use_tag_arguments(self):
+        for source in ("{% use %}", "{% use 'a' 'b' %}", "{% use a=1 'b' %}",
+                       "{% use 'a' b=1 b=2 %}"):
+            with self.assertRaises(TemplateSyntaxError):
+                Template('{% load formulation %}' + source)
+
 
 class FlatAttrsFilterTest(TemplateTestMixin, SimpleTestCase):
     """
@@ -375,3 +406,533 @@ class MultipleFormsTest(TemplateTestMixin, SimpleTestCase):
         rendered = template.render(self.context)
         self.assertIn('foo', rendered)
         self.assertIn('bar', rendered)
+
+
+class CustomInput(forms.TextInput):
+    pass
+
+
+class CustomCharField(forms.CharField):
+    widget = CustomInput
+
+
+class SubclassForm(forms.Form):
+    title = CustomCharField()
+    other = forms.CharField(widget=forms.Textarea)
+
+
+class DispatchTest(TemplateTestMixin, SimpleTestCase):
+    """
+    Test auto widget fallback and the dispatch cache.
+    """
+    TEMPLATES = {
+        'test.form': '''
+{% block TextInput %}text input{% endblock %}
+        ''',
+    }
+    PARTIALS = {
+        'subclass_widget': "{% field form.title %}",
+        'missing_widget': "{% field form.other %}",
+    }
+
+    def test_auto_widget_ancestors(self):
+        names = auto_widget(SubclassForm()['title'])
+        self.assertEqual(names[:7], [
+            'CustomCharField_CustomInput_title',
+            'CustomCharField_title',
+            'CustomInput_title',
+            'CustomCharField_CustomInput',
+            'title',
+            'CustomInput',
+            'CustomCharField',
+        ])
+        self.assertIn('TextInput', names)
+        self.assertIn('CharField_TextInput', names)
+        self.assertTrue(names.index('CharField') < names.index('TextInput'))
+
+    def test_subclass_falls_back(self):
+        template = get_template('subclass_widget')
+        context = Context({'form': SubclassForm()})
+        self.assertEqual(template.render(context), 'text input')
+        # Second time around comes from the dispatch cache
+        self.assertEqual(template.render(context), 'text input')
+
+    def test_cached_miss(self):
+        template = get_template('missing_widget')
+        context = Context({'form': SubclassForm()})
+        for x in range(2):
+            with self.assertRaises(TemplateSyntaxError):
+                template.render(context)
+
+
+class ColourForm(forms.Form):
+    colour = forms.ModelChoiceField(queryset=Colour.objects.all())
+    colours = forms.ModelMultipleChoiceField(queryset=Colour.objects.all())
+
+
+class ChoicesTest(TemplateTestMixin, TestCase):
+    """
+    Test choices are only evaluated once, and what is derived from them.
+    """
+    TEMPLATES = {
+        'test.form': '''
+{% block Select %}{% for val, label in choices %}{{ val }}:{{ label }},\
+{% endfor %}|{{ display }}{% endblock %}
+{% block SelectMultiple %}{{ display|join:"," }}|\
+{% for val, label in choices %}{% if val in selected %}{{ label }}{% endif %}\
+{% endfor %}{% endblock %}
+        ''',
+    }
+    PARTIALS = {
+        'model_choice': "{% field form.colour %}",
+        'model_multiple_choice': "{% field form.colours %}",
+        'two_forms': "{% field form.colour %};{% field other.colour %}",
+        'formset': "{% formset 'test.form' formset %}"
+                   "{% field form.colour %};{% endformset %}",
+    }
+
+    def setUp(self):
+        self.red = Colour.objects.create(name='red')
+        self.blue = Colour.objects.create(name='blue')
+
+    def test_single_query(self):
+        template = get_template('model_choice')
+        form = ColourForm(initial={'colour': self.blue.pk})
+        context = Context({'form': form})
+        with self.assertNumQueries(1):
+            rendered = template.render(context)
+        self.assertEqual(
+            rendered,
+            ':---------,%d:red,%d:blue,|blue' % (self.red.pk, self.blue.pk),
+        )
+
+    def test_multiple_display(self):
+        template = get_template('model_multiple_choice')
+        context = Context({'form': ColourForm(initial={
+            'colours': [self.red.pk, self.blue.pk],
+        })})
+        with self.assertNumQueries(1):
+            rendered = template.render(context)
+        self.assertEqual(rendered, 'red,blue|redblue')
+
+    def test_shared_between_forms(self):
+        template = get_template('two_forms')
+        context = Context({
+            'form': ColourForm(initial={'colour': self.red.pk}),
+            'other': ColourForm(initial={'colour': self.blue.pk}),
+        })
+        with self.assertNumQueries(1):
+            rendered = template.render(context)
+        choices = ':---------,%d:red,%d:blue,' % (self.red.pk, self.blue.pk)
+        self.assertEqual(rendered, '%s|red;%s|blue' % (choices, choices))
+
+    def test_shared_between_rows(self):
+        ColourFormSet = forms.formsets.formset_factory(
+            ColourForm, extra=3, max_num=3,
+        )
+        template = get_template('formset')
+        context = Context({'formset': ColourFormSet()})
+        with self.assertNumQueries(1):
+            rendered = template.render(context)
+        self.assertEqual(rendered.count(':red,'), 3)
+
+    def test_different_querysets(self):
+        form = ColourForm()
+        other = ColourForm()
+        other.fields['colour'].queryset = Colour.objects.filter(name='red')
+        shared = {}
+        self.assertIsNot(
+            shared_choices(form.fields['colour'], shared),
+            shared_choices(other.fields['colour'], shared),
+        )
+        self.assertIs(
+            shared_choices(form.fields['colour'], shared),
+            shared_choices(ColourForm().fields['colour'], shared),
+        )
+        self.assertEqual(len(shared), 2)
+
+
+class OptionForm(forms.Form):
+    choice = forms.ChoiceField(choices=[(1, 'One'), (2, 'Two'), (3, 'Three')])
+    multi = forms.MultipleChoiceField(choices=[], widget=forms.SelectMultiple)
+
+
+class OptionsTagTest(TemplateTestMixin, SimpleTestCase):
+    """
+    Test the options tag renders each choice, and caches it.
+    """
+    TEMPLATES = {
+        'test.form': '''
+{% load formulation %}
+{% block Select %}{% options "option" %}{% endblock %}
+{% block SelectMultiple %}\
+{% options "option" choices=extra_choices selected=picked %}{% endblock %}
+{% block option %}{{ forloop.counter }}{{ html_name }}:{{ val }}={{ display }}\
+{% if selected %}*{% endif %}{% if forloop.last %}.{% else %},{% endif %}\
+{% endblock %}
+{% block dynamic %}{% use name %}{% endblock %}
+{% block Textarea %}{% options "dynamic" choices=extra_choices %}{% endblock %}
+{% block Identity %}{% options "identity" %}{% endblock %}
+{% block identity %}{{ form_field.html_name }}:{{ val }},{% endblock %}
+        ''',
+    }
+    PARTIALS = {
+        'select': "{% field form.choice %}",
+        'explicit': "{% field form.multi picked=picked %}",
+        'uncached': "{% field form.multi 'Textarea' name='option' %}",
+        'identity': "{% field form.choice 'Identity' %}",
+    }
+
+    def test_selected(self):
+        template = get_template('select')
+        self.assertEqual(
+            template.render(Context({'form': OptionForm()})),
+            '1choice:1=One,2choice:2=Two,3choice:3=Three.',
+        )
+        form = OptionForm(initial={'choice': 2})
+        self.assertEqual(
+            template.render(Context({'form': form})),
+            '1choice:1=One,2choice:2=Two*,3choice:3=Three.',
+        )
+
+    def test_explicit(self):
+        template = get_template('explicit')
+        context = Context({
+            'form': OptionForm(),
+            'extra_choices': [('a', 'A'), ('b', 'B')],
+            'picked': ['b'],
+        })
+        self.assertEqual(template.render(context), '1multi:a=A,2multi:b=B*.')
+
+    def test_explicit_values(self):
+        # Explicit choices and values are compared as text
+        template = get_template('explicit')
+        context = Context({
+            'form': OptionForm(),
+            'extra_choices': [(1, 'A'), (2, 'B'), (3, 'C')],
+            'picked': [1, 3],
+        })
+        self.assertEqual(
+            template.render(context), '1multi:1=A*,2multi:2=B,3multi:3=C*.'
+        )
+        context['picked'] = 2
+        self.assertEqual(
+            template.render(context), '1multi:1=A,2multi:2=B*,3multi:3=C.'
+        )
+
+    def test_cached(self):
+        template = get_template('select')
+        template.render(Context({'form': OptionForm()}))
+        # The field's name is part of the key
+        form = OptionForm(prefix='x', initial={'choice': 3})
+        self.assertEqual(
+            template.render(Context({'form': form})),
+            '1x-choice:1=One,2x-choice:2=Two,3x-choice:3=Three*.',
+        )
+        self.assertEqual(len(_option_cache), 2)
+
+    def test_incomplete_analysis(self):
+        template = get_template('uncached')
+        context = Context({
+            'form': OptionForm(),
+            'extra_choices': [('a', 'A')],
+        })
+        self.assertEqual(template.render(context), '1multi:a=A.')
+
+    def test_identity_values(self):
+        # form_field is a new object every time, so isn't part of a key
+        template = get_template('identity')
+        size = len(_option_cache)
+        self.assertEqual(
+            template.render(Context({'form': OptionForm()})),
+            'choice:1,choice:2,choice:3,',
+        )
+        self.assertEqual(len(_option_cache), size)
+
+
+class FieldDataTest(TemplateTestMixin, SimpleTestCase):
+    """
+    Field data is only computed when a block uses it.
+    """
+    TEMPLATES = {
+        'test.form': '''
+{% block label_only %}{{ label }}{% endblock %}
+{% block errors %}{{ errors|length }}{% endblock %}
+        ''',
+    }
+    PARTIALS = {
+        'label_only': "{% field form.name 'label_only' %}",
+        'label_override': "{% field form.name 'label_only' label='Other' %}",
+        'errors': "{% field form.name 'errors' %}",
+    }
+
+    def test_lazy(self):
+        form = TestForm(data={})
+        get_template('label_only').render(Context({'form': form}))
+        # Looking up errors would have cleaned the form
+        self.assertIsNone(form._errors)
+
+        self.assertEqual(
+            get_template('errors').render(Context({'form': form})), '1'
+        )
+        self.assertIsNotNone(form._errors)
+
+    def test_override(self):
+        template = get_template('label_override')
+        self.assertEqual(template.render(self.context), 'Other')
+
+
+class StaticBlockTest(TemplateTestMixin, SimpleTestCase):
+    """
+    Blocks which only read static field data are rendered once.
+    """
+    TEMPLATES = {
+        'test.form': '''
+{% load formulation %}
+{% block _label %}<label for="{{ id }}">{{ label }}</label>{% endblock %}
+{% block TextInput %}{% use "_label" %}\
+<input value="{{ value|default:"" }}">{% endblock %}
+{% block Textarea %}{% use "_fields" %}{% endblock %}
+{% block _fields %}{% fields only="name" %}{% endblock %}
+{% block Tags %}{{ label }}:{{ tags }}:{{ tags|join:"," }}{% endblock %}
+{% block Loop %}{% for x in "ab" %}\
+{{ forloop.parentloop.counter }}{{ x }}{% endfor %}{% endblock %}
+        ''',
+    }
+    PARTIALS = {
+        'name': "{% field form.name %}",
+        'tags': '{% field form.name "Tags" tags=tags %}',
+        'loop': '{% for i in "12" %}{% field form.name "Loop" %}{% endfor %}',
+    }
+
+    def setUp(self):
+        _static_cache.clear()
+
+    def test_static(self):
+        template = get_template('name')
+        output = template.render(Context({'form': TestForm()}))
+        self.assertEqual(
+            output, '<label for="id_name">Name</label><input value="">')
+        self.assertEqual(len(_static_cache), 1)
+
+        form = TestForm(initial={'name': 'x'})
+        output = template.render(Context({'form': form}))
+        self.assertEqual(
+            output, '<label for="id_name">Name</label><input value="x">')
+        self.assertEqual(len(_static_cache), 1)
+
+        form = TestForm(prefix='p')
+        output = template.render(Context({'form': form}))
+        self.assertIn('for="id_p-name"', output)
+        self.assertEqual(len(_static_cache), 2)
+
+    def test_safe_label(self):
+        template = get_template('name')
+        form = TestForm()
+        form.fields['name'].label = '<b>'
+        self.assertIn('&lt;b&gt;', template.render(Context({'form': form})))
+        # Django 1.8+ keeps the bound fields of a form
+        form = TestForm()
+        form.fields['name'].label = mark_safe('<b>')
+        self.assertIn('><b><', template.render(Context({'form': form})))
+
+    def test_value_types(self):
+        template = get_template('tags')
+
+        def render(tags):
+            return template.render(Context({'form': TestForm(), 'tags': tags}))
+        self.assertEqual(render([1]), 'Name:[1]:1')
+        self.assertEqual(render((1,)), 'Name:(1,):1')
+        self.assertTrue(render(['<b>']).endswith(':&lt;b&gt;'))
+        self.assertTrue(render([mark_safe('<b>')]).endswith(':<b>'))
+
+    def test_parentloop(self):
+        # The block's output depends on the loop around it
+        output = get_template('loop').render(Context({'form': TestForm()}))
+        self.assertEqual(output, '1a1b2a2b')
+
+    def test_reads_form(self):
+        # {% fields %} renders the form given to {% form %}
+        template = Template(
+            "{% load formulation %}{% form 'test.form' form %}"
+            "{% field form.name 'Textarea' %}{% endform %}"
+        )
+        for value in ('a', 'b'):
+            form = TestForm(initial={'name': value})
+            self.assertIn(
+                'value="%s"' % value,
+                template.render(Context({'form': form})),
+            )
+
+
+class LetterForm(forms.Form):
+    a = forms.CharField(label='A')
+    b = forms.CharField(label='B')
+    c = forms.CharField(label='C')
+    letter = forms.ChoiceField(choices=[('x', 'X'), ('y', 'Y'), ('z', 'Z')])
+
+
+class StatefulBlockTest(TemplateTestMixin, SimpleTestCase):
+    """
+    Blocks with tags which keep state between renders aren't cached.
+    """
+    TEMPLATES = {
+        'test.form': '''
+{% load formulation %}
+{% block _label %}<{% cycle "odd" "even" %} {{ label }}>{% endblock %}
+{% block TextInput %}{% use "_label" %}{% endblock %}
+{% block Select %}{% options "_option" %}{% endblock %}
+{% block _option %}<{% cycle "odd" "even" %} {{ display }}>{% endblock %}
+        ''',
+    }
+    PARTIALS = {
+        'labels': '{% fields form only="a,b,c" %}|'
+                  '{% fields form only="a,b,c" %}',
+        'options': '{% field form.letter %}|{% field form.letter %}',
+    }
+
+    def setUp(self):
+        clear_caches()
+
+    def test_labels(self):
+        output = get_template('labels').render(Context({'form': LetterForm()}))
+        self.assertEqual(
+            output, '<odd A><even B><odd C>|<even A><odd B><even C>',
+        )
+        self.assertEqual(len(_static_cache), 0)
+
+    def test_options(self):
+        template = get_template('options')
+        output = template.render(Context({'form': LetterForm()}))
+        self.assertEqual(
+            output, '<odd X><even Y><odd Z>|<even X><odd Y><even Z>',
+        )
+        self.assertEqual(len(_option_cache), 0)
+
+
+class FieldsTagTest(TemplateTestMixin, SimpleTestCase):
+    """
+    Tests for the {% fields %} tag.
+    """
+    TEMPLATES = {
+        'test.form': '''
+{% load formulation %}
+{% block input %}[{{ name }}:{{ extra }}]{% endblock %}
+{% block TextInput %}{% use "input" %}{% endblock %}
+{% block CheckboxInput %}{% use "input" %}{% endblock %}
+{% block RadioSelect %}{% use "input" %}{% endblock %}
+{% block HiddenInput %}{% use "input" %}{% endblock %}
+        ''',
+    }
+    PARTIALS = {
+        'all_fields': "{% fields form %}",
+        'only': "{% fields form only='gender,name' extra='x' %}",
+    }
+
+    def test_all_fields(self):
+        template = get_template('all_fields')
+        expected = '[name:][is_cool:][gender:][hidden_gender:]'
+        self.assertEqual(template.render(self.context), expected)
+        # Again, from the cached plan
+        self.assertEqual(template.render(self.context), expected)
+
+    def test_only(self):
+        template = get_template('only')
+        self.assertEqual(template.render(self.context), '[gender:x][name:x]')
+
+    def test_exclude(self):
+        template = Template(
+            "{% load formulation %}{% form 'test.form' form %}"
+            "{% fields exclude=hide %}{% endform %}"
+        )
+        context = Context({'form': TestForm(), 'hide': ['name', 'gender']})
+        self.assertEqual(
+            template.render(context), '[is_cool:][hidden_gender:]')
+
+    def test_dynamic_fields(self):
+        template = get_template('all_fields')
+        form = TestForm()
+        del form.fields['is_cool']
+        self.assertEqual(
+            template.render(Context({'form': form})),
+            '[name:][gender:][hidden_gender:]',
+        )
+
+
+class RowForm(forms.Form):
+    name = forms.CharField()
+
+
+class FormsetTagTest(TemplateTestMixin, SimpleTestCase):
+    """
+    Tests for the {% formset %} tag.
+    """
+    TEMPLATE_BASE = '''{{% load formulation %}}{}'''
+    TEMPLATES = {
+        'test.form': '''
+{% load formulation %}
+{% block TextInput %}[{{ html_name }}={{ value|default:"" }}]{% endblock %}
+{% block HiddenInput %}({{ html_name }}={{ value }}){% endblock %}
+        ''',
+        'nohidden.form': '''
+{% block TextInput %}[{{ html_name }}]{% endblock %}
+        ''',
+        'badhidden.form': '''
+{% load formulation %}
+{% block HiddenInput %}{% field form_field "Missing" %}{% endblock %}
+{% block TextInput %}[{{ html_name }}]{% endblock %}
+        ''',
+    }
+    PARTIALS = {
+        'auto_fields': "{% formset 'test.form' formset %} {% endformset %}",
+        'body': "{% formset 'test.form' formset empty_form=True %}"
+                "<{% field form.name %}>{% endformset %}",
+        'no_hidden': "{% formset 'nohidden.form' formset %}{% endformset %}",
+        'bad_hidden': "{% formset 'badhidden.form' formset %}{% endformset %}",
+        'prototype': "{% formset 'test.form' formset empty_form='template' %}"
+                     "<{% field form.name %}>{% endformset %}",
+    }
+
+    def setUp(self):
+        RowFormSet = forms.formsets.formset_factory(RowForm, extra=1)
+        self.context = Context({
+            'formset': RowFormSet(initial=[{'name': 'a'}]),
+        })
+
+    def test_auto_fields(self):
+        template = get_template('auto_fields')
+        self.assertEqual(
+            template.render(self.context),
+            '(form-TOTAL_FORMS=2)(form-INITIAL_FORMS=1)'
+            '(form-MIN_NUM_FORMS=0)(form-MAX_NUM_FORMS=1000)'
+            '[form-0-name=a][form-1-name=]',
+        )
+
+    def test_body(self):
+        template = get_template('body')
+        rendered = template.render(self.context)
+        self.assertTrue(rendered.endswith(
+            '<[form-0-name=a]><[form-1-name=]><[form-__prefix__-name=]>'
+        ))
+
+    def test_no_hidden_block(self):
+        template = get_template('no_hidden')
+        rendered = template.render(self.context)
+        self.assertIn('name="form-TOTAL_FORMS"', rendered)
+        self.assertTrue(rendered.endswith('[form-0-name][form-1-name]'))
+
+    def test_hidden_block_error(self):
+        # Only a missing block falls back to Django's rendering
+        template = get_template('bad_hidden')
+        with self.assertRaises(TemplateSyntaxError):
+            template.render(self.context)
+
+    def test_empty_form_template(self):
+        template = get_template('prototype')
+        rendered = template.render(self.context)
+        self.assertIn('(form-TOTAL_FORMS=2)', rendered)
+        self.assertTrue(rendered.endswith(
+            '<[form-0-name=a]><[form-1-name=]>'
+            '<template data-formulation-formset="form">'
+            '<[form-__prefix__-name=]></template>'
+        ))
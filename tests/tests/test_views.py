@@ -0,0 +1,70 @@
+from django import forms
+from django.test import RequestFactory, SimpleTestCase
+from django.views.generic import FormView
+
+from formulation.views import FieldValidationMixin, clean_field
+
+from ..utils import TemplatesMixin
+
+
+TEMPLATES = {
+    'inline.form': '''
+{% block TextInput %}\
+<input name="{{ html_name }}" value="{{ value|default:"" }}">\
+{% for error in errors %}!{{ error }}{% endfor %}{% endblock %}
+''',
+}
+
+
+class SignupForm(forms.Form):
+    username = forms.CharField(max_length=5)
+    email = forms.EmailField(widget=forms.TextInput)
+
+    def clean(self):
+        raise forms.ValidationError('Not called')
+
+
+class SignupView(FieldValidationMixin, FormView):
+    form_class = SignupForm
+    field_template = 'inline.form'
+
+    def form_valid(self, form):
+        raise AssertionError('The whole form was processed')
+
+
+class FieldValidationTest(TemplatesMixin, SimpleTestCase):
+    TEMPLATES = TEMPLATES
+
+    def post(self, data):
+        request = RequestFactory().post('/', data)
+        return SignupView.as_view()(request)
+
+    def test_clean_field(self):
+        form = SignupForm({'username': 'toolong', 'email': 'bad'})
+        self.assertFalse(clean_field(form, 'username'))
+        self.assertEqual(list(form.errors), ['username'])
+        self.assertEqual(len(form.fields), 2)
+        self.assertFalse(clean_field(form, 'email'))
+        self.assertEqual(list(form.errors), ['email'])
+
+    def test_valid_field(self):
+        response = self.post({
+            'formulation-field': 'username', 'username': 'ok',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.content, b'<input name="username" value="ok">')
+
+    def test_invalid_field(self):
+        response = self.post({
+            'formulation-field': 'username', 'username': 'toolong',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(
+            response.content.startswith(
+                b'<input name="username" value="toolong">!'),
+        )
+
+    def test_unknown_field(self):
+        response = self.post({'formulation-field': 'password'})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,111 @@
+import os
+import shutil
+import tempfile
+
+from django import forms
+from django.apps import apps
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+from django.utils.six import StringIO
+
+from formulation.blocks import _block_index
+from formulation.templatetags.formulation import _plan_cache
+from formulation.utils import clear_caches
+from formulation.warmup import find_templates, warm_up
+
+from ..utils import template_dirs
+
+
+class GoodForm(forms.Form):
+    name = forms.CharField()
+
+
+class BadForm(forms.Form):
+    name = forms.CharField()
+    when = forms.DateField(widget=forms.SplitDateTimeWidget)
+
+
+class ArgumentForm(forms.Form):
+    def __init__(self, user, *args, **kwargs):
+        super(ArgumentForm, self).__init__(*args, **kwargs)
+
+
+class WarmUpTest(SimpleTestCase):
+
+    def setUp(self):
+        self.template_dir = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.template_dir, 'sub'))
+        self.write('site.form', '{% block TextInput %}{% endblock %}')
+        self.write('sub/other.form', '{% extends "site.form" %}')
+        self.write('page.html', '')
+        self.settings = template_dirs([self.template_dir])
+        self.settings.enable()
+        clear_caches()
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.template_dir)
+        clear_caches()
+
+    def write(self, name, content):
+        with open(os.path.join(self.template_dir, name), 'w') as fh:
+            fh.write(content)
+
+    def test_find_templates(self):
+        names = find_templates()
+        self.assertEqual(names[:2], ['site.form', 'sub/other.form'])
+        self.assertIn('formulation/default.form', names)
+
+    def test_index(self):
+        self.assertEqual(warm_up(['site.form', 'sub/other.form']), [])
+        self.assertIn('site.form', _block_index)
+        self.assertIn('sub/other.form', _block_index)
+
+    def test_forms(self):
+        problems = warm_up(['site.form'], {'site.form': [
+            GoodForm, 'tests.tests.test_warmup.BadForm', ArgumentForm,
+        ]})
+        self.assertEqual(
+            [(p.form, p.field) for p in problems],
+            [(BadForm, 'when'), (ArgumentForm, None)],
+        )
+        self.assertIn(
+            'Tried: DateField_SplitDateTimeWidget_when', str(problems[0]),
+        )
+        # Only GoodForm had a plan made
+        self.assertEqual(len(_plan_cache), 1)
+
+    def test_bad_template(self):
+        self.write('broken.form', '{% block A %}')
+        broken, missing = warm_up(['broken.form', 'missing.form'])
+        self.assertEqual((broken.template, broken.form), ('broken.form', None))
+        self.assertEqual(missing.template, 'missing.form')
+
+    def test_ready(self):
+        config = apps.get_app_config('formulation')
+        config.ready()
+        self.assertNotIn('site.form', _block_index)
+        with override_settings(FORMULATION_WARM_UP=True):
+            config.ready()
+        self.assertIn('site.form', _block_index)
+        self.assertIn('formulation/default.form', _block_index)
+
+    def test_command(self):
+        stdout = StringIO()
+        call_command(
+            'formulation_check', 'site.form', form=[
+                ['site.form', 'tests.tests.test_warmup.GoodForm'],
+            ], stdout=stdout,
+        )
+        self.assertEqual(stdout.getvalue().strip(), 'No problems found')
+
+        stderr = StringIO()
+        with self.assertRaises(CommandError):
+            call_command(
+                'formulation_check', 'site.form', form=[
+                    ['site.form', 'tests.tests.test_warmup.BadForm'],
+                ], stderr=stderr,
+            )
+        self.assertIn('BadForm.when', stderr.getvalue())
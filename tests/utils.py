@@ -0,0 +1,76 @@
+'''
+Loading test templates from a dict or directories, on any version of Django.
+'''
+import django
+from django.template import loader
+from django.test.utils import override_settings
+
+from formulation.utils import clear_caches
+
+if django.VERSION < (1, 8):
+    from django.test.utils import (
+        setup_test_template_loader, restore_template_loaders,
+    )
+
+_overrides = []
+
+
+def setup_templates(templates):
+    '''Load templates from a dict, until restore_templates() is called.'''
+    if django.VERSION < (1, 8):
+        setup_test_template_loader(templates)
+        return
+    override = override_settings(TEMPLATES=[{
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'OPTIONS': {
+            'loaders': [
+                ('django.template.loaders.locmem.Loader', templates),
+                'django.template.loaders.app_directories.Loader',
+            ],
+        },
+    }])
+    override.enable()
+    _overrides.append(override)
+
+
+def restore_templates():
+    if django.VERSION < (1, 8):
+        restore_template_loaders()
+    else:
+        _overrides.pop().disable()
+
+
+class TemplatesMixin(object):
+    '''Load the TEMPLATES of a test case while its tests run.'''
+    TEMPLATES = {}
+
+    @classmethod
+    def setUpClass(cls):
+        super(TemplatesMixin, cls).setUpClass()
+        setup_templates(cls.TEMPLATES)
+        # Test cases define widget templates of the same names
+        clear_caches()
+
+    @classmethod
+    def tearDownClass(cls):
+        restore_templates()
+        super(TemplatesMixin, cls).tearDownClass()
+
+
+def template_dirs(dirs, debug=False):
+    '''override_settings to load templates from dirs, and apps.'''
+    if django.VERSION < (1, 8):
+        return override_settings(TEMPLATE_DIRS=dirs, TEMPLATE_DEBUG=debug)
+    return override_settings(TEMPLATES=[{
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': dirs,
+        'APP_DIRS': True,
+        'OPTIONS': {'debug': debug},
+    }])
+
+
+def get_template(name):
+    '''Load a template which renders with a Context, as they did before
+    Django 1.8 wrapped them for its template backends.'''
+    template = loader.get_template(name)
+    return getattr(template, 'template', template)